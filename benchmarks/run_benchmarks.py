@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Throughput benchmarks of the pipeline stages on synthetic corpora (see synthetic.py)
+#
+#   python run_benchmarks.py --sizes 10000 100000 1000000
+#   python run_benchmarks.py --compare results/OLD.json results/NEW.json
+#
+# Every run is saved to results/<date>-<commit>.json with the machine it ran on, so runs of
+# different commits can be compared. Corpora are generated once per size and seed and kept in
+# corpora/ as parquet files. Benchmarks whose libraries (or NLTK data) are not installed are reported as skipped.
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+from synthetic import make_corpus
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd = HERE,
+                                       stderr = subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# Synthetic corpus of n_articles, generated on the first use and read back from disk afterwards
+def load_corpus(n_articles, seed):
+    path = os.path.join(HERE, "corpora", "synthetic_%d_%d.parquet" % (n_articles, seed))
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    corpus = make_corpus(n_articles, seed = seed)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    corpus.to_parquet(path, index = False)
+    return corpus
+
+
+# Runs fn() once and returns the seconds it took and what it returned
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def run_size(corpus, args):
+    results = []
+
+    def record(name, rows, fn):
+        try:
+            seconds, result = timed(fn)
+        except (ImportError, LookupError) as error:
+            results.append({'benchmark': name, 'size': len(corpus), 'skipped': str(error)})
+            print("  %-22s skipped (%s)" % (name, error))
+            return None
+        results.append({'benchmark': name, 'size': len(corpus), 'rows': rows, 'seconds': seconds,
+                        'rows_per_s': rows / seconds if seconds > 0 else None})
+        print("  %-22s %10.2f s %12.0f rows/s" % (name, seconds, rows / seconds if seconds > 0 else 0))
+        return result
+
+    fullarticle = corpus['title'] + ' ' + corpus['text']
+    n = len(corpus)
+
+    def twitter():
+        from features import twitter_username_count
+        return twitter_username_count(corpus)
+    record("twitter_username_count", n, twitter)
+
+    def clean_serial():
+        from preprocessing import clean_series
+        sample = fullarticle.iloc[:args.serial_rows]
+        return clean_series(sample, n_jobs = 1)
+    record("pre_clean_serial", min(n, args.serial_rows), clean_serial)
+
+    def clean_parallel():
+        from preprocessing import clean_series
+        return clean_series(fullarticle, n_jobs = args.jobs)
+    clean = record("pre_clean_parallel", n, clean_parallel)
+    if clean is None:
+        return results
+    clean = clean.tolist()
+
+    def ngrams():
+        from ngrams import count_ngrams
+        return count_ngrams(clean, corpus['isfake'], orders = (1, 2, 3)).top(3, 10)
+    record("top_ngrams_1_2_3", n, ngrams)
+
+    # The vocabulary is built the way the notebook builds it: the clean articles are stored as a TokenCorpus
+    # once (next to the synthetic corpora) and the FrozenTokenizer is fitted from its word ids (see corpus.py)
+    from corpus import build_corpus
+    corpus_path = os.path.join(HERE, "corpora", "tokens_%d_%d" % (n, args.seed))
+    corpus_store = record("corpus_build", n, lambda: build_corpus(clean, corpus_path, labels = corpus['isfake']))
+    frozen_tokenizer = record("corpus_fit_tokenizer", n, lambda: corpus_store.fit_tokenizer(num_words = args.max_features))
+    record("corpus_encode_padded", n, lambda: corpus_store.encode_padded(frozen_tokenizer, args.maxlength))
+    record("frozen_encode_padded", n,
+           lambda: frozen_tokenizer.encode_padded(clean, args.maxlength, padding = 'post', truncating = 'post'))
+
+    def inference():
+        # Untrained weights score just as fast as trained ones
+        from model import build_fakenews_model
+        from predict import FakeNewsPredictor
+        model = build_fakenews_model(args.max_features, maxlength = args.maxlength)
+        predictor = FakeNewsPredictor(model, frozen_tokenizer, args.maxlength, batch_size = args.batch_size)
+        return predictor.predict(clean[:args.inference_rows], clean = False)
+    record("model_inference", min(n, args.inference_rows), inference)
+
+    # The Keras Tokenizer the notebook used before, for comparison (Keras 3 does not have it anymore)
+    def tokenizer_fit():
+        from tensorflow.keras.preprocessing.text import Tokenizer
+        tokenizer = Tokenizer(num_words = args.max_features)
+        tokenizer.fit_on_texts(clean)
+        return tokenizer
+    tokenizer = record("tokenizer_fit", n, tokenizer_fit)
+    if tokenizer is None:
+        return results
+
+    def keras_pad():
+        from tensorflow.keras.preprocessing.sequence import pad_sequences
+        return pad_sequences(tokenizer.texts_to_sequences(clean), maxlen = args.maxlength,
+                             padding = 'post', truncating = 'post')
+    record("keras_texts_to_padded", n, keras_pad)
+
+    return results
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    old_results = {(r['benchmark'], r['size']): r for r in old['results'] if 'rows_per_s' in r}
+    print("%-24s %10s %14s %14s %8s" % ("benchmark", "size", old['commit'], new['commit'], "speedup"))
+    for r in new['results']:
+        before = old_results.get((r['benchmark'], r['size']))
+        if before is None or 'rows_per_s' not in r or not before['rows_per_s']:
+            continue
+        print("%-24s %10d %14.0f %14.0f %7.2fx" % (r['benchmark'], r['size'], before['rows_per_s'],
+                                                   r['rows_per_s'], r['rows_per_s'] / before['rows_per_s']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the pipeline stages on synthetic news corpora")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [10000, 100000, 1000000],
+                        help = "number of articles of every synthetic corpus")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--jobs", type = int, default = None, help = "cleaning processes (default: all cores)")
+    parser.add_argument("--serial-rows", type = int, default = 20000, help = "articles cleaned by the serial benchmark")
+    parser.add_argument("--inference-rows", type = int, default = 20000, help = "articles scored by the model")
+    parser.add_argument("--max-features", type = int, default = 100000)
+    parser.add_argument("--maxlength", type = int, default = 40)
+    parser.add_argument("--batch-size", type = int, default = 256)
+    parser.add_argument("--output", default = None, help = "results file (default: results/<date>-<commit>.json)")
+    parser.add_argument("--compare", nargs = 2, metavar = ("OLD", "NEW"), help = "compare two results files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    commit = git_commit()
+    run = {
+        'commit': commit,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'processor': platform.processor(), 'cpus': os.cpu_count()},
+        'seed': args.seed,
+        'results': [],
+    }
+    for size in args.sizes:
+        print("Corpus of %d articles" % size)
+        run['results'] += run_size(load_corpus(size, args.seed), args)
+
+    output = args.output or os.path.join(HERE, "results", "%s-%s.json" % (time.strftime("%Y%m%d-%H%M%S"), commit))
+    os.makedirs(os.path.dirname(output), exist_ok = True)
+    with open(output, "w") as f:
+        json.dump(run, f, indent = 2)
+    print("Saved results to", output)
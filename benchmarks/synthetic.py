@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Synthetic news corpora that look like True.csv / Fake.csv (title, text, subject, date, isfake)
+# Words follow a Zipf distribution over a generated vocabulary, real and fake articles use slightly
+# different word distributions, and the articles contain the same kind of noise as the real data:
+# html fragments and entities, URLs, @mentions and [bracket] tags. The same seed always gives the same corpus.
+
+import numpy as np
+import pandas as pd
+
+
+SUBJECTS_REAL = ['politicsNews', 'worldnews']
+SUBJECTS_FAKE = ['News', 'politics', 'left-news', 'Government News', 'US_News', 'Middle-east']
+BRACKET_TAGS = ['[Video]', '[VIDEO]', '[Watch]', '[Tweets]', '[IMAGES]', '[Details]']
+HTML_FRAGMENTS = ['<p>', '</p>', '<br/>', '<a href="http://example.com/story">', '</a>', '&amp;', '&quot;']
+
+
+# Vocabulary of made-up lowercase words (plus a few capitalized ones so lowercasing has work to do)
+def make_vocabulary(size, rng):
+    lengths = rng.randint(2, 11, size)
+    letters = ''.join(map(chr, rng.randint(ord('a'), ord('z') + 1, lengths.sum())))
+    ends = np.cumsum(lengths)
+    words = [letters[end - n:end] for end, n in zip(ends, lengths)]
+    for i in range(0, size, 7):
+        words[i] = words[i].capitalize()
+    return np.array(words, dtype = object)
+
+
+# Word ids drawn from a Zipf-like distribution over the vocabulary, shifted for the fake articles
+def _word_ids(n, vocab_size, isfake, rng):
+    ids = (rng.zipf(1.3, n) - 1) % vocab_size
+    if isfake:
+        ids = (ids + 1) % vocab_size
+    return ids
+
+
+def _article(words, isfake, rng):
+    parts = list(words)
+    n = len(parts)
+    # noise, more of it in the fake articles like in the real data
+    for _ in range(rng.poisson(3 if isfake else 0.5)):
+        parts.insert(rng.randint(0, n + 1), '@' + rng.choice(words))
+    for _ in range(rng.poisson(1 if isfake else 0.3)):
+        parts.insert(rng.randint(0, n + 1), 'https://t.co/' + ''.join(rng.choice(list('abcdefgXYZ0123'), 10)))
+    if rng.rand() < 0.05:
+        parts.insert(rng.randint(0, n + 1), rng.choice(HTML_FRAGMENTS))
+    if rng.rand() < 0.2:
+        parts.insert(rng.randint(0, n + 1), rng.choice(BRACKET_TAGS))
+    text = ' '.join(parts)
+    if not isfake:
+        text = 'WASHINGTON (Reuters) - ' + text
+    return text
+
+
+# DataFrame of n_articles synthetic articles, about half of them fake
+# mean_words is the average number of words per article (the real data has a few hundred)
+def make_corpus(n_articles, seed = 0, vocab_size = 50000, mean_words = 250):
+    rng = np.random.RandomState(seed)
+    vocabulary = make_vocabulary(vocab_size, rng)
+    isfake = rng.randint(0, 2, n_articles)
+    lengths = np.maximum(5, rng.poisson(mean_words, n_articles))
+
+    titles, texts, subjects = [], [], []
+    for fake, length in zip(isfake, lengths):
+        words = vocabulary[_word_ids(length, vocab_size, fake, rng)]
+        title = ' '.join(words[:rng.randint(5, 15)])
+        if fake and rng.rand() < 0.3:
+            title += ' ' + rng.choice(BRACKET_TAGS)
+        titles.append(title)
+        texts.append(_article(words, fake, rng))
+        subjects.append(rng.choice(SUBJECTS_FAKE if fake else SUBJECTS_REAL))
+
+    return pd.DataFrame({
+        'title': titles,
+        'text': texts,
+        'subject': subjects,
+        'date': 'December 31, 2017',
+        'isfake': isfake,
+    })
@@ -7,57 +7,26 @@
 
 
 # Libraries
+# Only the libraries used all through the notebook are imported here. The heavy ones (tensorflow, plotly,
+# sklearn, nltk, ...) are imported in the cells that need them, so the cleaning and EDA cells do not wait for tensorflow.
+# NLTK data is never downloaded by the notebook, install it once beforehand (see resources.py)
 
 import pandas as pd
 import numpy as np
 
 import matplotlib.pyplot as plt
-import seaborn as sns
-from wordcloud import WordCloud, STOPWORDS
-import plotly.express as px
-import plotly.graph_objects as go
-import plotly.offline as pyo
 #import plotly.io as pio
 
-import re
-
 #from jupyterthemes import jtplot
 #jtplot.style(theme='monokai', context='notebook', ticks=True, grid=False) 
 # setting the style of the notebook to be monokai theme  
 # this theme helps make the x and y axes labels clearly on plots which are black on black
 
-from PIL import Image
-
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-from sklearn.metrics import confusion_matrix, classification_report
-from sklearn.feature_extraction.text import CountVectorizer
-
-import nltk
-from nltk.stem import PorterStemmer, WordNetLemmatizer
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize, sent_tokenize
-
-nltk.download('punkt')
-
-from bs4 import BeautifulSoup
-
-import string
-from string import punctuation
-from collections import Counter
-
-import gensim
-from gensim.utils import simple_preprocess
-from gensim.parsing.preprocessing import STOPWORDS
-
-import tensorflow as tf 
-from tensorflow.keras.preprocessing.text import one_hot, Tokenizer
-from tensorflow.keras.preprocessing.sequence import pad_sequences
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Flatten, Embedding, Input, LSTM, Conv1D, MaxPool1D, Bidirectional, LSTM, Dropout
-from tensorflow.keras.models import Model
-from tensorflow.keras.callbacks import ReduceLROnPlateau
-from tensorflow.keras.optimizers import Adam
+# Timing and memory use of the main stages (see profiling.py), written to ../reports/stage_profile.json at the end
+# Set profile_stages = False to turn it off, the stages run exactly the same either way
+from profiling import StageProfiler
+profile_stages = True
+profiler = StageProfiler(enabled = profile_stages)
 
 
 # **Importing, viewing and wrangling both real and fake news datasets**
@@ -66,8 +35,9 @@ from tensorflow.keras.optimizers import Adam
 
 
 # Load both real and fake news data files
-df_real = pd.read_csv("../data/True.csv")
-df_fake = pd.read_csv("../data/Fake.csv")
+with profiler.stage("load_csv"):
+    df_real = pd.read_csv("../data/True.csv")
+    df_fake = pd.read_csv("../data/Fake.csv")
 
 
 # In[4]:
@@ -142,14 +112,8 @@ df_fake.head(10)
 # In[13]:
 
 
-# Function to count the total twitter username mentions 
-def twitter_username_count(df):
-    twitter_username = re.compile(r'@([A-Za-z0-9_]+)')
-    count = 0
-    list_ = []
-    for name in df['text']:
-        count += len(re.findall(twitter_username, name))
-    return count
+# Function to count the total twitter username mentions (see features.py)
+from features import twitter_username_count, article_signals
 
 
 # In[14]:
@@ -183,11 +147,21 @@ df_allnews.drop(columns = ['date'], inplace = True)
 df_allnews
 
 
+# In[17]:
+
+
+# Per article counts of twitter usernames, hashtags, URLs, [bracket] tags and html tags
+signals = article_signals(df_allnews['text'])
+signals.groupby(df_allnews['isfake']).sum()
+
+
 # **Visualizing the distribution of real and fake articles in the data**
 
 # In[82]:
 
 
+import seaborn as sns
+
 # Countplot of the breakdown in the subject column 
 # Notice the plot shows that the dataset is almost balanced between real and fake news
 plt.figure(figsize = (8, 8))
@@ -238,20 +212,10 @@ df_allnews['fullarticle'][0]
 # In[21]:
 
 
-# Download stopwords
-nltk.download("stopwords")
-
-
-# In[22]:
-
-
-# Adding stopwords
-stop_words = set(stopwords.words('english'))
-#stop_words
-
-# Adding punctuation to the stopwords list
-punctuation = list(string.punctuation)
-stop_words.update(punctuation)
+# The stop_words set (stopwords + punctuation) is built in preprocessing.py so that the cleaning can also
+# run in worker processes. The NLTK stopwords are read from the local nltk_data, they are not downloaded
+# here (see resources.py for how to install them)
+from preprocessing import stop_words
 #stop_words
 
 
@@ -261,49 +225,28 @@ stop_words.update(punctuation)
 
 
 # Lets pre-clean the article text a little
-# Remove html elements  
-def remove_html(text):
-    soup = BeautifulSoup(text, "html.parser")
-    return soup.get_text()
-
-# Remove square brackets with Regular Expression
-def remove_square_brackets(text):
-    return re.sub('\[[^]]*\]', '', text)
-
-# Remove URLs with Regular Expression
-def remove_urls(text):
-    return re.sub(r'http\S+', '', text)
-
-def lowercase(text):
-    return text.lower()
-
-def remove_stopwords(text):
-    final_text = []
-    for i in text.split():
-        if i.strip().lower() not in stop_words:
-            final_text.append(i.strip())
-    return " ".join(final_text)
-
-def lemmatize(text):
-    lemm = nltk.stem.WordNetLemmatizer()
-    return lemm.lemmatize(text)
-    #return [lemm.lemmatize(text) for word in text if word not in stop_words]
-
-# Pre-cleaning of text
-def pre_clean(text):
-    text = remove_html(text)
-    text = remove_square_brackets(text)
-    text = remove_urls(text)
-    text = lowercase(text)
-    text = remove_stopwords(text)
-    text = lemmatize(text)
-    return text
-
+# remove_html, remove_square_brackets, remove_urls, lowercase, remove_stopwords and lemmatize
+# are chained together by pre_clean (see preprocessing.py)
+from preprocessing import cached_clean_series
 
+# Apply pre-clean function
+# clean_series gives the same result as df_allnews['fullarticle'].apply(pre_clean)
+# but spreads the articles over all the cores (n_jobs = 1 to run it serially)
+# cached_clean_series also keeps the cleaned articles in ../data/clean_cache.parquet,
+# so a rerun only cleans the articles that are new or have changed
+with profiler.stage("pre_clean", rows = len(df_allnews)):
+    df_allnews['clean'] = cached_clean_series(df_allnews['fullarticle'], "../data/clean_cache.parquet")
 
+# Hit rate of the word -> lemma cache over all the cleaning processes (nothing to show when every article came from the clean cache)
+from preprocessing import lemma_cache_info
+lemma_stats = lemma_cache_info()
+if lemma_stats.hits + lemma_stats.misses:
+    print("Lemma cache hit rate: %.1f%%" % (100 * lemma_stats.hits / (lemma_stats.hits + lemma_stats.misses)))
 
-# Apply pre-clean function
-df_allnews['clean'] = df_allnews['fullarticle'].apply(pre_clean)
+# For news feeds that do not fit in memory, ingest.py does the loading, labelling and cleaning above
+# a chunk at a time and writes the result to a parquet file instead:
+# from ingest import stream_clean_csvs
+# stream_clean_csvs([("../data/True.csv", 0), ("../data/Fake.csv", 1)], "../data/allnews_clean.parquet")
 
 
 # In[24]:
@@ -326,6 +269,17 @@ print(df_allnews['fullarticle'][0])
 df_allnews
 
 
+# In[93]:
+
+
+# Integer encoded copy of the clean articles (see corpus.py): every article is split into words once and
+# kept as int32 word ids in ../data/corpus, opened with memory mapping. The article lengths, the n-grams and
+# the tokenizer and padded sequences for the model below are all computed from it
+from corpus import build_corpus
+with profiler.stage("build_corpus", rows = len(df_allnews)):
+    corpus = build_corpus(df_allnews.clean, "../data/corpus", labels = df_allnews.isfake)
+
+
 # **Visualizing data**
 
 # **Word clouds!**
@@ -334,10 +288,24 @@ df_allnews
 # In[27]:
 
 
+# Word counts of the real and fake articles (see wordindex.py), used by the word clouds and the top 30 words plots
+# The index is kept in ../data/word_index.json, so a rerun only counts the words of new articles
+# (it is counted again when articles were removed from the corpus, so it always matches df_allnews)
+from wordindex import WordFrequencyIndex
+word_index = WordFrequencyIndex.load("../data/word_index.json")
+with profiler.stage("word_index", rows = len(df_allnews)):
+    word_index.sync(df_allnews.clean, df_allnews.isfake)
+    word_index.save("../data/word_index.json")
+
+# The word clouds are drawn from these counts, rendered clouds are cached in ../data/wordcloud_cache (see wordclouds.py)
+from wordclouds import wordcloud_image
+wordcloud_cache = "../data/wordcloud_cache"
+
 # Creating a word cloud plot for articles that are real (isfake = 0)
 plt.figure(figsize = (20, 20)) 
-wc = WordCloud(max_words = 2000, width = 1600, height = 800, 
-               stopwords = stop_words).generate(" ".join(df_allnews[df_allnews.isfake == 0].clean))
+with profiler.stage("wordcloud_real"):
+    wc = wordcloud_image(word_index.frequencies(isfake = 0), wordcloud_cache, stopwords = stop_words,
+                         max_words = 2000, width = 1600, height = 800)
 plt.imshow(wc, interpolation = 'bilinear')
 plt.axis('off')
 plt.tight_layout(pad = 0) 
@@ -349,8 +317,9 @@ plt.show()
 
 # Creating a word cloud plot for articles that are fake (isfake = 1)
 plt.figure(figsize = (20, 20)) 
-wc = WordCloud(max_words = 2000, width = 1600, height = 800, 
-               stopwords = stop_words).generate(" ".join(df_allnews[df_allnews.isfake == 1].clean))
+with profiler.stage("wordcloud_fake"):
+    wc = wordcloud_image(word_index.frequencies(isfake = 1), wordcloud_cache, stopwords = stop_words,
+                         max_words = 2000, width = 1600, height = 800)
 plt.imshow(wc, interpolation = 'bilinear')
 plt.axis('off')
 plt.tight_layout(pad = 0) 
@@ -363,15 +332,13 @@ plt.show()
 
 
 # Creating a custom word cloud plot for articles that are fake (isfake = 1)
-mask = np.array(Image.open('../imgs/USACanada_BlankMap.png'))
-
-wc_fun = WordCloud(stopwords = stop_words, mask = mask, background_color = "white", 
-               max_words = 2000, max_font_size = 256, contour_width = 2, contour_color = 'lightgrey',
-               random_state = 42).generate(" ".join(df_allnews[df_allnews.isfake == 1].clean))
-               #width=mask.shape[1], 
-               #height=mask.shape[0]).generate(" ".join(df_allnews[df_allnews.isfake == 1].clean))
-#wc.generate(article.text)
-plt.figure(figsize=[200,100])
+mask_path = '../imgs/USACanada_BlankMap.png'
+
+with profiler.stage("wordcloud_fake_map"):
+    wc_fun = wordcloud_image(word_index.frequencies(isfake = 1), wordcloud_cache, stopwords = stop_words,
+                             mask_path = mask_path, background_color = "white", max_words = 2000, max_font_size = 256,
+                             contour_width = 2, contour_color = 'lightgrey', random_state = 42)
+plt.figure(figsize=[20,10])
 plt.imshow(wc_fun, interpolation="bilinear")
 plt.axis('off')
 plt.tight_layout(pad = 0) 
@@ -382,13 +349,11 @@ plt.show()
 
 
 # Creating a custom word cloud plot for articles that are real (isfake = 0)
-wc_fun = WordCloud(stopwords = stop_words, mask = mask, background_color = "white",
-               max_words = 2000, max_font_size = 256, contour_width = 3, contour_color = 'lightgrey',
-               random_state = 42).generate(" ".join(df_allnews[df_allnews.isfake == 0].clean))
-               #width=mask.shape[1], 
-               #height=mask.shape[0]).generate(" ".join(df_allnews[df_allnews.isfake == 0].clean))
-#wc.generate(article.text)
-plt.figure(figsize=[200,100])
+with profiler.stage("wordcloud_real_map"):
+    wc_fun = wordcloud_image(word_index.frequencies(isfake = 0), wordcloud_cache, stopwords = stop_words,
+                             mask_path = mask_path, background_color = "white", max_words = 2000, max_font_size = 256,
+                             contour_width = 3, contour_color = 'lightgrey', random_state = 42)
+plt.figure(figsize=[20,10])
 plt.imshow(wc_fun, interpolation="bilinear")
 plt.axis('off')
 plt.tight_layout(pad = 0) 
@@ -399,26 +364,34 @@ plt.show()
 
 
 # Creating tokens ie breaking up into unique words
-print(nltk.word_tokenize(df_allnews['clean'][1]))
+from nltk.tokenize import word_tokenize
+from resources import require_nltk
+require_nltk("punkt_tab", "punkt")
+print(word_tokenize(df_allnews['clean'][1]))
 
 
 # In[33]:
 
 
+# Keeping the number of tokens, characters and words of every article as columns
+# (n_tokens, n_chars and n_words), the plots below all read from these columns
+# The number of tokens comes from the corpus, so the articles are not tokenized again
+from features import token_stats
+with profiler.stage("token_stats", rows = len(df_allnews)):
+    df_allnews[['n_tokens', 'n_chars', 'n_words']] = token_stats(df_allnews, corpus = corpus)
+
 # Getting the maximum article length. 
-max_len = -1
-for article in df_allnews.clean:
-    tokens = nltk.word_tokenize(article) # creates the tokens ie every unique word
-    if(max_len < len(tokens)):
-        max_len = len(tokens)
+max_len = df_allnews.n_tokens.max()
 print("The maximum number of words in any article is =", max_len)
 
 
 # In[34]:
 
 
+import plotly.express as px
+
 # Using plotly to create a histogram (interactable) for the distribution of number of words in an article
-maxLengthPlot = px.histogram(x = [len(nltk.word_tokenize(x)) for x in df_allnews.clean], 
+maxLengthPlot = px.histogram(x = df_allnews.n_tokens, 
                              title='Distribution of Total Number of Words Per Article', 
                              labels={'x':'Number of Words Per Article'}, nbins = 100)
 maxLengthPlot.show("notebook") # Forces the notebook renderer to reload to show plot
@@ -433,10 +406,10 @@ maxLengthPlot.show("notebook") # Forces the notebook renderer to reload to show
 
 # Plots which show the number of characters in both real and fake articles
 fig,(ax1,ax2) = plt.subplots(1, 2, figsize = (12, 8))
-article_length = df_allnews[df_allnews['isfake'] == 0]['clean'].str.len()
+article_length = df_allnews[df_allnews['isfake'] == 0]['n_chars']
 ax1.hist(article_length, color = 'green')
 ax1.set_title('Real Articles')
-article_length = df_allnews[df_allnews['isfake'] == 1]['clean'].str.len()
+article_length = df_allnews[df_allnews['isfake'] == 1]['n_chars']
 ax2.hist(article_length, color = 'red')
 ax2.set_title('Fake Articles')
 fig.suptitle('Number of characters in articles')
@@ -452,10 +425,10 @@ plt.show()
 
 # Plots which show the number of words in both real and fake articles
 fig,(ax1,ax2) = plt.subplots(1, 2, figsize = (12, 8))
-article_length = df_allnews[df_allnews['isfake'] == 0]['text'].str.split().map(lambda x: len(x))
+article_length = df_allnews[df_allnews['isfake'] == 0]['n_words']
 ax1.hist(article_length,color = 'green')
 ax1.set_title('Real Article')
-article_length = df_allnews[df_allnews['isfake'] == 1]['text'].str.split().map(lambda x: len(x))
+article_length = df_allnews[df_allnews['isfake'] == 1]['n_words']
 ax2.hist(article_length,color = 'red')
 ax2.set_title('Fake Article')
 fig.suptitle('Number of words in articles')
@@ -469,8 +442,11 @@ plt.show()
 # In[38]:
 
 
+import plotly.graph_objects as go
+import plotly.offline as pyo
+
 # Top 30 words in the real articles
-df_news_real = pd.DataFrame(pd.Series(' '.join(df_allnews[df_allnews['isfake'] == 0]['clean']).split()).value_counts()).head(30)
+df_news_real = pd.Series(dict(word_index.top(30, isfake = 0))).to_frame()
 
 plot_data = [
     go.Bar(
@@ -493,7 +469,7 @@ pyo.iplot(fig)
 
 
 # Top 30 words in the fake articles
-df_news_fake = pd.DataFrame(pd.Series(' '.join(df_allnews[df_allnews['isfake'] == 1]['clean']).split()).value_counts()).head(30)
+df_news_fake = pd.Series(dict(word_index.top(30, isfake = 1))).to_frame()
 
 plot_data = [
     go.Bar(
@@ -515,24 +491,16 @@ pyo.iplot(fig)
 # In[40]:
 
 
-# Function to create a corpus and count the frequency of each word in all the articles
+# The frequency of each word in all the articles is already counted by word_index above
 # Dsiplay 1st 5 words in the corpus
-def get_corpus(text):
-    words = []
-    for i in text:
-        for j in i.split():
-            words.append(j.strip())
-    return words
-corpus = get_corpus(df_allnews.clean)
-corpus[:5]
+df_allnews.clean[0].split()[:5]
 
 
 # In[41]:
 
 
 # Check the most common words with their counts
-counter = Counter(corpus)
-most_common = counter.most_common(10)
+most_common = word_index.top(10)
 most_common = dict(most_common)
 most_common
 
@@ -543,14 +511,12 @@ most_common
 # In[42]:
 
 
-# A function to return the most common n-grams
-def top_ngrams(corpus, n, g):
-    vec = CountVectorizer(ngram_range = (g, g)).fit(corpus)
-    bag_of_words = vec.transform(corpus)
-    sum_words = bag_of_words.sum(axis = 0) 
-    words_freq = [(word, sum_words[0, idx]) for word, idx in vec.vocabulary_.items()]
-    words_freq = sorted(words_freq, key = lambda x: x[1], reverse = True)
-    return words_freq[:n]
+# Counting the unigrams, bigrams and trigrams of all articles in one pass, also per class (isfake)
+# ngram_counts.top(g, n) returns the n most common g-grams, ngram_counts.top(g, n, isfake = 1) only for fake news
+# The n-grams are counted from the word ids of the corpus
+# (same as count_ngrams(df_allnews.clean, df_allnews.isfake, orders = (1, 2, 3)) with the corpus' words, see ngrams.py)
+with profiler.stage("ngrams", rows = len(df_allnews)):
+    ngram_counts = corpus.ngram_counts(orders = (1, 2, 3))
 
 
 # In[43]:
@@ -558,7 +524,7 @@ def top_ngrams(corpus, n, g):
 
 # Unigram (1 word sequence) Analysis
 plt.figure(figsize = (16, 9))
-top_unigrams = top_ngrams(df_allnews.clean, 10, 1)
+top_unigrams = ngram_counts.top(1, 10)
 unigram_chart = dict(top_unigrams)
 unigram_chart = sns.barplot(x = list(unigram_chart.keys()), y = list(unigram_chart.values()))
 unigram_chart.set_xticklabels(unigram_chart.get_xticklabels(), rotation = 45, horizontalalignment = 'right')
@@ -571,7 +537,7 @@ plt.show()
 
 # Bigram (2 word sequence) Analysis
 plt.figure(figsize = (16, 9))
-top_bigrams = top_ngrams(df_allnews.clean, 10, 2)
+top_bigrams = ngram_counts.top(2, 10)
 bigram_chart = dict(top_bigrams)
 bigram_chart = sns.barplot(x = list(bigram_chart.keys()), y = list(bigram_chart.values()))
 bigram_chart.set_xticklabels(bigram_chart.get_xticklabels(), rotation = 45, horizontalalignment = 'right')
@@ -584,13 +550,25 @@ plt.show()
 
 # Trigram (3 word sequence) Analysis
 plt.figure(figsize = (16, 9))
-top_trigrams = top_ngrams(df_allnews.clean, 10, 3)
+top_trigrams = ngram_counts.top(3, 10)
 trigram_chart = dict(top_trigrams)
 trigram_chart = sns.barplot(x = list(trigram_chart.keys()), y = list(trigram_chart.values()))
 trigram_chart.set_xticklabels(trigram_chart.get_xticklabels(), rotation = 45, horizontalalignment = 'right')
 trigram_chart.set_title("Top 10 Trigrams in all news")
 
 
+# In[91]:
+
+
+# Writing all of the figures above to ../reports/eda as PNG / HTML files, drawn in parallel by worker processes
+# Only the figures whose data changed since the last run are drawn again (see report.py, which also runs without the notebook)
+from report import report_figures, render_report
+with profiler.stage("eda_report"):
+    eda_figures = report_figures(df_allnews, word_index, ngram_counts, stop_words, mask_path = mask_path,
+                                 wordcloud_cache = wordcloud_cache)
+    render_report(eda_figures, "../reports/eda")
+
+
 # - Notice what the most frequently mentioned word(s) is(are). Surprised? :-P
 
 # **Modeling with Neural Networks**
@@ -598,9 +576,37 @@ trigram_chart.set_title("Top 10 Trigrams in all news")
 # In[46]:
 
 
+# Finding near-duplicate articles (the same story posted several times with small changes) with MinHash and LSH
+# (see dedup.py), articles with the same id in near_duplicates are copies of each other
+# Set dedup_mode to "drop" to keep only one article of each cluster, or "group" to keep them all but
+# put every cluster either in the training or in the test set, None splits without looking at duplicates
+from dedup import near_duplicate_clusters, cluster_sizes, first_of_cluster, group_train_test_split
+dedup_mode = "group"
+
+with profiler.stage("near_duplicates", rows = len(df_allnews)):
+    near_duplicates = near_duplicate_clusters(df_allnews.clean)
+print("Articles with at least one near-duplicate: ", (np.bincount(near_duplicates)[near_duplicates] > 1).sum())
+cluster_sizes(near_duplicates)
+
+
+# In[92]:
+
+
+from sklearn.model_selection import train_test_split
+
 # Splitting data into train (80%) and test (20%) sets, x/input is the 'clean' column data, 
 # y/target/output is ithe sfake column data (what we are predicting)
-x_train, X_test, y_train, y_test = train_test_split(df_allnews.clean, df_allnews.isfake, test_size = 0.2)
+if dedup_mode == "drop":
+    df_unique = df_allnews[first_of_cluster(near_duplicates)]
+    x_train, X_test, y_train, y_test = train_test_split(df_unique.clean, df_unique.isfake, test_size = 0.2)
+elif dedup_mode == "group":
+    x_train, X_test, y_train, y_test = group_train_test_split(df_allnews.clean, df_allnews.isfake,
+                                                              groups = near_duplicates, test_size = 0.2)
+else:
+    x_train, X_test, y_train, y_test = train_test_split(df_allnews.clean, df_allnews.isfake, test_size = 0.2)
+
+# Keeping the clean text of both sets, x_train and X_test are replaced by the padded sequences below
+x_train_text, X_test_text = x_train, X_test
 
 
 # In[47]:
@@ -612,22 +618,39 @@ x_train, X_test, y_train, y_test = train_test_split(df_allnews.clean, df_allnews
 max_features = 100000
 maxlength = 40
 
-tokenizer = Tokenizer(num_words = max_features) 
-tokenizer.fit_on_texts(x_train) # Creates the vocabulary
-tokenized_train = tokenizer.texts_to_sequences(x_train) # Creates the sequence of integers
+# Set to True to put articles of similar length in the same batch and pad every batch only up to its
+# longest article (see input_pipeline.py) instead of padding everything to maxlength.
+# This makes much longer articles affordable, so maxlength is raised as well
+bucketed_batches = False
+if bucketed_batches:
+    maxlength = 512
+
+# Rows of the training and test articles in df_allnews (and in the corpus)
+train_rows, test_rows = x_train.index.to_numpy(), X_test.index.to_numpy()
+
+# Creates the vocabulary of the training articles from the word counts of the corpus, the same words and ids as
+# Tokenizer(num_words = max_features).fit_on_texts(x_train) followed by FrozenTokenizer.from_keras (see corpus.py).
+# The frozen tokenizer is saved with the model after training so it can be loaded again for
+# predictions without fitting the tokenizer (see encoding.py). It gives the same integers as tokenizer.texts_to_sequences
+with profiler.stage("tokenizer_fit", rows = len(x_train)):
+    frozen_tokenizer = corpus.fit_tokenizer(train_rows, num_words = max_features)
 
 # Adding padding can either be maxlength = 4406 (from above) or smaller number maxlength = 40 seems to work 
 # well based on results
 # Pad sequences make all news articles the same length 
-x_train = pad_sequences(tokenized_train, maxlen = maxlength, padding = 'post', truncating = 'post')
+# encode_padded creates the sequence of integers and pads it in one step from the corpus ids,
+# same as pad_sequences(tokenizer.texts_to_sequences(x_train), ...) or frozen_tokenizer.encode_padded(x_train, ...)
+with profiler.stage("encode_train", rows = len(x_train)):
+    x_train = corpus.encode_padded(frozen_tokenizer, maxlength, rows = train_rows, padding = 'post', truncating = 'post')
 
 
 # In[48]:
 
 
 # Let's do the same thing but tokenize the test data
-tokenized_test = tokenizer.texts_to_sequences(X_test) # Creates the sequence of integers
-X_test = pad_sequences(tokenized_test, maxlen = maxlength, truncating = 'post')
+# (with the same 'post' padding as the training data, so the model sees test articles the same way)
+with profiler.stage("encode_test", rows = len(X_test)):
+    X_test = corpus.encode_padded(frozen_tokenizer, maxlength, rows = test_rows, padding = 'post', truncating = 'post')
 
 
 # In[90]:
@@ -648,36 +671,73 @@ epochs = 10
 embedding_size = 128
 val_split = 0.1
 
+# Set to True to stream the training articles from disk through tf.data (see input_pipeline.py)
+# instead of passing the padded x_train array to fit
+streaming_input = False
+
+# Pretrained word vectors for the frozen embedding layer (see embeddings.py), e.g. GloVe or word2vec vectors
+# converted once with embeddings.convert_vectors. None keeps the randomly initialized embedding layer
+pretrained_vectors = None # "../data/word_vectors.kv"
+
+# Data parallel training on all the cores (see training.py): training_replicas copies of the model each train on
+# batch_size articles of every step, so the global batch size and the learning rate grow with the replicas.
+# The replicas share the cores (the intra-op thread pool) of this process, so compare the training samples
+# per second printed after fit with training_replicas = 1 before keeping more replicas.
+# intra_op_threads / inter_op_threads = None keep TensorFlow's defaults. To train with several worker processes
+# (e.g. one per socket) save x_train and y_train with training.save_training_arrays and run training.py --workers N
+training_replicas = 1
+intra_op_threads = None
+inter_op_threads = None
+
 
 # In[51]:
 
 
+from tensorflow.keras.callbacks import ReduceLROnPlateau
+from training import configure_threads, make_strategy, scaled_hyperparameters, throughput_callback
+from training import BASE_LEARNING_RATE, MIN_LEARNING_RATE
+
+# TensorFlow's thread pools and the replicas have to be set up before TensorFlow runs anything
+configure_threads(intra_op_threads, inter_op_threads)
+strategy = make_strategy(training_replicas)
+global_batch_size, learning_rate = scaled_hyperparameters(strategy.num_replicas_in_sync, batch_size)
+
 # ReduceLROnPlateau reduces the learning rate when a metric has stopped improving. 
 # Models can often benefit from reducing the learning rate. This monitors the quantity, if there is no improvement 
 # in the 'patience' parameter number of epochs, the learning rate is reduced.
+# (min_lr is scaled like the learning rate, it is 0.00001 with one replica)
 learning_rate_reduction = ReduceLROnPlateau(monitor='val_accuracy', patience = 2, 
-                                            verbose=1,factor=0.5, min_lr=0.00001)
+                                            verbose=1,factor=0.5, min_lr=MIN_LEARNING_RATE * learning_rate / BASE_LEARNING_RATE)
 
 
 # In[52]:
 
 
-#Defining the Neural Network by initializing the sequential model
-fakenews_model = Sequential()
-
-# Adding the non-trainable embedding layer
-fakenews_model.add(Embedding(max_features, output_dim = embedding_size, input_length = maxlength, trainable = False))
-# fakenews_model.add(Embedding(total_words, output_dim = 240))
-
-# Building a Bi-Directional RNN and LSTM model
-fakenews_model.add(Bidirectional(LSTM(128)))
-
-# Adding Dense layers
-fakenews_model.add(Dense(128, activation = 'relu')) # adding 128 dense layers with relu activation 
-# Output is only 1 neuron, why? Essentially doing binary classification with an output of 0 or 1
-fakenews_model.add(Dense(1,activation= 'sigmoid')) # adding dense of 1 neuron with sigmoid activation
-# compiling model with adam optimizer and binary crossentropy loss with metrics being accuracy
-fakenews_model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy']) 
+# Filling the frozen embedding layer with the pretrained vectors of the tokenizer's words
+# The vectors file is memory mapped, so only the vectors of the top max_features words are read
+# The vectors are set as the weights of the embedding layer once the model is built (a Constant
+# initializer would copy the whole matrix into the model config, which prune_embedding rebuilds from)
+pretrained_matrix = None
+if pretrained_vectors:
+    from embeddings import load_vectors, embedding_matrix
+    pretrained_matrix, coverage = embedding_matrix(load_vectors(pretrained_vectors), frozen_tokenizer, max_features)
+    print("Fraction of the vocabulary with a pretrained vector: ", coverage)
+    embedding_size = pretrained_matrix.shape[1]
+
+# Defining the Neural Network (see model.py):
+# non-trainable embedding layer -> Bi-Directional LSTM -> Dense(128, relu) -> Dense(1, sigmoid),
+# compiled with adam optimizer and binary crossentropy loss
+# (with bucketed batches the length of the articles changes from batch to batch, and the embedding masks
+# the padding so evaluate, the predictor and the exported model, which pad to maxlength, give the same scores)
+# The model is built in the strategy's scope so every replica gets a copy, with the scaled learning rate
+# (Adam(0.001), the same as 'adam', with one replica)
+from tensorflow.keras.optimizers import Adam
+from model import build_fakenews_model
+with strategy.scope():
+    fakenews_model = build_fakenews_model(max_features, embedding_size, None if bucketed_batches else maxlength,
+                                          optimizer = Adam(learning_rate), mask_zero = bucketed_batches)
+    if pretrained_matrix is not None:
+        fakenews_model.layers[0].set_weights([pretrained_matrix])
 fakenews_model.summary()
 
 # have approx 13Mil trainable parameters
@@ -703,11 +763,37 @@ y_test = np.asarray(y_test)
 # Running 10 epochs 
 # if error is going down on both training and validation, thats good, it means model is able to generalize
 # if error is going down for training but going up in validation, it means the model is overfitting the training data
-model_history = fakenews_model.fit(x_train, y_train, batch_size = batch_size, validation_split = val_split, 
-                                   epochs = epochs, callbacks = [learning_rate_reduction])
+# throughput reports the training samples per second of every epoch
+throughput = throughput_callback(int(len(x_train_text) * (1 - val_split)))
+with profiler.stage("fit", rows = len(x_train_text) * epochs):
+    if streaming_input or bucketed_batches:
+        # The articles are encoded and padded in parallel while the model trains, with the same
+        # batch size and the same last 10% of the training data used for validation
+        from input_pipeline import write_training_file, training_datasets, array_datasets
+        if streaming_input:
+            write_training_file(x_train_text, y_train, "../data/train.parquet")
+            train_ds, val_ds = training_datasets("../data/train.parquet", frozen_tokenizer, maxlength,
+                                                 batch_size = global_batch_size, validation_split = val_split,
+                                                 bucketed = bucketed_batches)
+        else:
+            train_ds, val_ds = array_datasets(x_train_text, y_train, frozen_tokenizer, maxlength,
+                                              batch_size = global_batch_size, validation_split = val_split,
+                                              bucketed = bucketed_batches)
+        model_history = fakenews_model.fit(train_ds, validation_data = val_ds,
+                                           epochs = epochs, callbacks = [learning_rate_reduction, throughput])
+    else:
+        model_history = fakenews_model.fit(x_train, y_train, batch_size = global_batch_size, validation_split = val_split, 
+                                           epochs = epochs, callbacks = [learning_rate_reduction, throughput])
+print("Training samples per second (%d replicas, global batch %d): %.1f"
+      % (strategy.num_replicas_in_sync, global_batch_size, np.mean(throughput.samples_per_second)))
 
 # Notice that the performance is amazing! Accuracy ~99% for both. Both losses also drop.
 
+# Saving the model together with the frozen tokenizer and maxlength in ../models,
+# FakeNewsPredictor.load("../models") loads them again to score new articles (see predict.py)
+from predict import save_model_artifacts, FakeNewsPredictor
+save_model_artifacts("../models", fakenews_model, frozen_tokenizer, maxlength, dynamic_padding = bucketed_batches)
+
 
 # **Evaluating the results after training the model**
 
@@ -759,13 +845,18 @@ plt.show()
 
 
 # Checking prediction scores from the model
-prediction = fakenews_model.predict_classes(X_test)
+# predictor.predict returns the probability of each article being fake, scored in micro-batches
+predictor = FakeNewsPredictor(fakenews_model, frozen_tokenizer, maxlength, dynamic_padding = bucketed_batches)
+probabilities = predictor.predict(X_test_text, clean = False)
+prediction = (probabilities > 0.5).astype(int)
 prediction[:5]
 
 
 # In[64]:
 
 
+from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
+
 # Printing out scores
 print(classification_report(y_test, prediction, target_names = ['Fake','Not Fake']))
 
@@ -773,13 +864,8 @@ print(classification_report(y_test, prediction, target_names = ['Fake','Not Fake
 # In[65]:
 
 
-# If the predicted value is > 0.5 it is real else it is fake
-pred_vals = []
-for i in range(len(prediction)):
-    if prediction[i].item() > 0.5:
-        pred_vals.append(1)
-    else:
-        pred_vals.append(0)
+# If the predicted value is > 0.5 it is fake else it is real
+pred_vals = (probabilities > 0.5).astype(int)
 
 
 # In[66]:
@@ -825,6 +911,73 @@ plt.xlabel("Predicted")
 plt.ylabel("Actual")
 
 
+# **Comparing with a lightweight linear model**
+# - Hashed unigram and bigram counts with a linear classifier trained by SGD (see baseline.py), on the same train/test split
+
+# In[72]:
+
+
+import time
+from baseline import LinearBaseline
+
+start = time.perf_counter()
+linear_model = LinearBaseline().fit(x_train_text, y_train)
+print("Training time of the linear model (seconds): ", time.perf_counter() - start)
+
+start = time.perf_counter()
+linear_pred = linear_model.predict(X_test_text)
+print("Articles scored per second by the linear model: ", len(X_test_text) / (time.perf_counter() - start))
+
+
+# In[73]:
+
+
+# Printing out scores of the linear model
+print(classification_report(y_test, linear_pred, target_names = ['Fake','Not Fake']))
+print("Linear Model Accuracy : ", accuracy_score(list(y_test), linear_pred))
+
+
+# In[74]:
+
+
+# Confusion matrix of the linear model
+cm_linear = confusion_matrix(list(y_test), linear_pred)
+plt.figure(figsize = (10, 10))
+sns.heatmap(cm_linear, linewidth = 1, annot = True, fmt = '', xticklabels = ['Fake', 'Real'],
+            yticklabels = ['Fake', 'Real'])
+plt.xlabel("Predicted")
+plt.ylabel("Actual")
+
+
+# **Exporting a smaller model for CPU serving**
+
+# In[70]:
+
+
+# The embedding table only needs a row for the ids the tokenizer can output, and the TensorFlow Lite version
+# stores the weights as int8 (see export.py). FakeNewsPredictor.load("../models", tflite = True) uses it
+from export import prune_embedding, export_tflite, TFLiteModel, parity_report, file_size_mb, TFLITE_FILE
+small_model = prune_embedding(fakenews_model, len(frozen_tokenizer.words) + 1)
+tflite_path = export_tflite(small_model, "../models/" + TFLITE_FILE, maxlength)
+print("Float model size (MB): ", file_size_mb("../models/fakenews_model.keras"))
+print("TFLite model size (MB): ", file_size_mb(tflite_path))
+
+
+# In[71]:
+
+
+# Checking that the smaller model gives (almost) the same predictions on the test data
+parity_report(fakenews_model, TFLiteModel(tflite_path), X_test, y_test)
+
+
+# In[75]:
+
+
+# Saving the timing and memory use of every stage
+profiler.save("../reports/stage_profile.json")
+pd.DataFrame(profiler.report())
+
+
 # In[ ]:
 
 
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Lightweight linear model to compare against the LSTM
+# Unigrams and bigrams of the clean articles are hashed into a fixed number of sparse features
+# (HashingVectorizer, nothing to fit and no vocabulary to keep in memory) and a linear classifier
+# is trained with SGD a chunk of articles at a time, so it also works on data that does not fit in memory.
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+
+class LinearBaseline:
+
+    def __init__(self, n_features = 2 ** 20, ngram_range = (1, 2), alpha = 1e-6, epochs = 5,
+                 chunk_size = 10000, random_state = 42):
+        self.vectorizer = HashingVectorizer(n_features = n_features, ngram_range = ngram_range,
+                                            alternate_sign = False)
+        # modified_huber gives probabilities (predict_proba) like a logistic regression would
+        self.classifier = SGDClassifier(loss = 'modified_huber', alpha = alpha, random_state = random_state)
+        self.epochs = epochs
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+
+    # Trains on one chunk of clean articles and their isfake labels
+    def partial_fit(self, texts, labels):
+        self.classifier.partial_fit(self.vectorizer.transform(texts), np.asarray(labels), classes = [0, 1])
+        return self
+
+    # Trains on (texts, labels) chunks, e.g. read from disk by fit_parquet
+    def fit_chunks(self, chunks):
+        for texts, labels in chunks:
+            self.partial_fit(texts, labels)
+        return self
+
+    # Trains for a few epochs over articles that are in memory, shuffled every epoch
+    def fit(self, texts, labels):
+        texts = np.asarray(list(texts), dtype = object)
+        labels = np.asarray(labels)
+        rng = np.random.RandomState(self.random_state)
+        for epoch in range(self.epochs):
+            order = rng.permutation(len(texts))
+            for start in range(0, len(order), self.chunk_size):
+                rows = order[start:start + self.chunk_size]
+                self.partial_fit(texts[rows], labels[rows])
+        return self
+
+    # Trains on a parquet file with clean and isfake columns (e.g. written by input_pipeline.write_training_file)
+    # reading chunk_size articles at a time
+    def fit_parquet(self, path):
+        import pyarrow.parquet as pq
+        for epoch in range(self.epochs):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size = self.chunk_size, columns = ['clean', 'isfake']):
+                self.partial_fit(batch.column(0).to_pylist(), batch.column(1).to_numpy())
+        return self
+
+    # Probability of every article being fake
+    def predict_proba(self, texts):
+        return self.classifier.predict_proba(self.vectorizer.transform(texts))[:, 1]
+
+    def predict(self, texts):
+        return self.classifier.predict(self.vectorizer.transform(texts))
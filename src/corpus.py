@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Integer encoded copy of the clean articles, shared by the stages that need the words of the articles
+# The articles are split into words once (the same way as the Keras Tokenizer) and stored CSR style:
+#   vocab.json   - the distinct words, word id i is vocab[i]
+#   tokens.i32   - the word ids of all the articles one after the other (int32)
+#   offsets.i64  - article i is tokens[offsets[i]:offsets[i + 1]] (int64, one more than the articles)
+#   labels.i8    - isfake of every article (optional)
+# The arrays are plain binary files opened with memory mapping, so opening the corpus reads almost
+# nothing and 4 bytes per word replace the Python string of every article.
+# The n-gram counts, the article lengths, the tokenizer vocabulary and the padded model input are
+# all computed from these arrays without splitting the articles into words again.
+
+import os
+import json
+import shutil
+
+import numpy as np
+
+from encoding import KERAS_FILTERS, FrozenTokenizer
+from ngrams import NgramCounts, OTHER, _add_block
+
+
+CORPUS_VERSION = "1"
+META_FILE = "meta.json"
+VOCAB_FILE = "vocab.json"
+TOKENS_FILE = "tokens.i32"
+OFFSETS_FILE = "offsets.i64"
+LABELS_FILE = "labels.i8"
+
+
+class TokenCorpus:
+
+    def __init__(self, vocab, tokens, offsets, labels = None, filters = KERAS_FILTERS, lower = True, split = ' '):
+        self.vocab = vocab          # id -> word
+        self.tokens = tokens        # word ids of all the articles
+        self.offsets = offsets      # start of every article in tokens, plus the end of the last one
+        self.labels = labels        # isfake of every article, or None
+        self.filters = filters
+        self.lower = lower
+        self.split = split
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get('version') != CORPUS_VERSION:
+            raise ValueError("%s was written by another version of corpus.py, build it again" % path)
+        with open(os.path.join(path, VOCAB_FILE)) as f:
+            vocab = json.load(f)
+
+        def array(name, dtype, length):
+            # np.memmap can not map an empty file
+            if length == 0:
+                return np.empty(0, dtype = dtype)
+            return np.memmap(os.path.join(path, name), dtype = dtype, mode = 'r', shape = (length,))
+
+        labels = array(LABELS_FILE, np.int8, meta['n_articles']) if meta['labels'] else None
+        return cls(vocab, array(TOKENS_FILE, np.int32, meta['n_tokens']),
+                   array(OFFSETS_FILE, np.int64, meta['n_articles'] + 1), labels,
+                   meta['filters'], meta['lower'], meta['split'])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # Number of words of every article
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    # The words of article i
+    def words(self, i):
+        return [self.vocab[t] for t in self.tokens[self.offsets[i]:self.offsets[i + 1]]]
+
+    # The word ids of the given articles (in that order) as one flat int64 array, plus their lengths
+    def _gather(self, rows):
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        # position in tokens of every word: the start of its article plus its place in the article
+        shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return self.tokens[shift + np.arange(lengths.sum())].astype(np.int64), lengths
+
+    # Blocks of (word ids, lengths, rows) over the given articles (all of them by default)
+    def _blocks(self, rows = None, block_size = 10000):
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows)
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            ids, lengths = self._gather(block)
+            yield ids, lengths, block
+
+    # Same as count_ngrams(texts, labels, orders) but from the stored word ids
+    # (the words are the Keras Tokenizer's words, so "trump's" is one word here)
+    def ngram_counts(self, orders = (1, 2, 3), rows = None, block_size = 10000, max_ngrams = 5000000):
+        labels = self.labels if self.labels is not None else np.zeros(len(self), dtype = np.int8)
+        classes = sorted(np.unique(labels).tolist())
+        label_idx = np.searchsorted(classes, labels)
+        counts = {g: (np.empty(0, dtype = np.int64), np.zeros((0, len(classes)), dtype = np.int64)) for g in orders}
+        for ids, lengths, block in self._blocks(rows, block_size):
+            # n-gram keys only have room for 2 ** 21 - 1 distinct words, the rare ones after that share an id
+            _add_block(counts, np.minimum(ids, OTHER), lengths, label_idx[block], len(classes), max_ngrams)
+        return NgramCounts(self.vocab[:OTHER], classes, counts)
+
+    # Same vocabulary as Tokenizer(num_words = num_words).fit_on_texts(articles) -> FrozenTokenizer.from_keras:
+    # words sorted by count, ties in the order the words first appear in the articles (rows, in that order)
+    def fit_tokenizer(self, rows = None, num_words = None, block_size = 10000):
+        counts = np.zeros(len(self.vocab), dtype = np.int64)
+        first = np.full(len(self.vocab), np.iinfo(np.int64).max, dtype = np.int64)
+        position = 0
+        for ids, lengths, block in self._blocks(rows, block_size):
+            counts += np.bincount(ids, minlength = len(self.vocab))
+            seen, index = np.unique(ids, return_index = True)
+            first[seen] = np.minimum(first[seen], index + position)
+            position += len(ids)
+        used = np.flatnonzero(counts)
+        order = used[np.lexsort((first[used], -counts[used]))]
+        if num_words:
+            order = order[:num_words - 1]
+        return FrozenTokenizer([self.vocab[i] for i in order], self.filters, self.lower, self.split)
+
+    # Same as frozen_tokenizer.encode_padded(articles, maxlen, ...) for the given articles, without
+    # looking up any word again: the corpus ids are mapped to the tokenizer ids with one table
+    def encode_padded(self, frozen_tokenizer, maxlen, rows = None, padding = 'post', truncating = 'post',
+                      dtype = 'int32', block_size = 10000):
+        table = np.array([frozen_tokenizer.word_index.get(word, 0) for word in self.vocab], dtype = np.int64)
+        n = len(self) if rows is None else len(rows)
+        out = np.zeros((n, maxlen), dtype = dtype)
+        done = 0
+        for ids, lengths, block in self._blocks(rows, block_size):
+            ids = table[ids]
+            doc = np.repeat(np.arange(len(block)), lengths)
+            # words the tokenizer does not know are dropped, like texts_to_sequences does
+            known = ids > 0
+            ids, doc = ids[known], doc[known]
+            kept = np.bincount(doc, minlength = len(block))
+            rank = np.arange(len(ids)) - (np.cumsum(kept) - kept)[doc]
+            if truncating == 'pre':
+                rank -= np.maximum(kept - maxlen, 0)[doc]
+            inside = (rank >= 0) & (rank < maxlen)
+            ids, doc, rank = ids[inside], doc[inside], rank[inside]
+            if padding == 'pre':
+                rank += (maxlen - np.minimum(kept, maxlen))[doc]
+            out[done + doc, rank] = ids
+            done += len(block)
+        return out
+
+
+# Splits the articles into words (like the Keras Tokenizer) and writes them to a TokenCorpus folder at
+# path, block_size articles at a time so the Python strings of only one block are in memory at once
+def build_corpus(texts, path, labels = None, filters = KERAS_FILTERS, lower = True, split = ' ', block_size = 10000):
+    splitter = FrozenTokenizer((), filters, lower, split)
+    tmp_path = path.rstrip("/") + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    vocab = {}
+    n_tokens, n_articles = 0, 0
+    texts = iter(texts)
+    with open(os.path.join(tmp_path, TOKENS_FILE), "wb") as tokens_file, \
+         open(os.path.join(tmp_path, OFFSETS_FILE), "wb") as offsets_file:
+        offsets_file.write(np.zeros(1, dtype = np.int64).tobytes())
+        while True:
+            block = [text for _, text in zip(range(block_size), texts)]
+            if not block:
+                break
+            ids, lengths = [], np.empty(len(block), dtype = np.int64)
+            for i, text in enumerate(block):
+                words = splitter.text_to_words(text)
+                lengths[i] = len(words)
+                for word in words:
+                    idx = vocab.get(word)
+                    if idx is None:
+                        idx = vocab[word] = len(vocab)
+                    ids.append(idx)
+            tokens_file.write(np.array(ids, dtype = np.int32).tobytes())
+            offsets_file.write((n_tokens + np.cumsum(lengths)).tobytes())
+            n_tokens += len(ids)
+            n_articles += len(block)
+
+    if labels is not None:
+        labels = np.asarray(labels, dtype = np.int8)
+        if len(labels) != n_articles:
+            raise ValueError("%d labels for %d articles" % (len(labels), n_articles))
+        labels.tofile(os.path.join(tmp_path, LABELS_FILE))
+    with open(os.path.join(tmp_path, VOCAB_FILE), "w") as f:
+        json.dump(list(vocab), f)
+    with open(os.path.join(tmp_path, META_FILE), "w") as f:
+        json.dump({'version': CORPUS_VERSION, 'n_articles': n_articles, 'n_tokens': n_tokens,
+                   'labels': labels is not None, 'filters': filters, 'lower': lower, 'split': split}, f)
+
+    # the finished corpus replaces the old one only once it is complete
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return TokenCorpus.open(path)
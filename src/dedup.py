@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Near-duplicate articles (the same wire story reposted with small changes) with MinHash and LSH
+# Every article is turned into its set of word 3-grams (shingles) and summarized by a MinHash
+# signature of num_perm values, two articles agree on a signature value with a probability equal to
+# the Jaccard similarity of their shingle sets. LSH banding then only compares articles that agree on
+# all the rows of at least one band, so the whole corpus is handled in about linear time instead of
+# comparing every pair of articles. Candidates whose estimated similarity is at least threshold are
+# joined into clusters of near-duplicates.
+#
+#   clusters = near_duplicate_clusters(df_allnews.clean)
+#   cluster_sizes(clusters)                       # how many clusters of each size
+#   df_allnews[first_of_cluster(clusters)]        # one article per cluster
+#   group_train_test_split(X, y, groups = clusters, test_size = 0.2)   # whole clusters in train or test
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.model_selection import GroupShuffleSplit
+
+from ngrams import default_tokenizer, _encode, _ngram_keys
+
+
+EMPTY = np.uint32(0xFFFFFFFF)
+
+
+# 64 bit mixing function (splitmix64 finalizer), spreads the packed shingle keys over all the bits
+def _mix(keys):
+    x = keys.astype(np.uint64)
+    with np.errstate(over = 'ignore'):
+        x ^= x >> np.uint64(30)
+        x *= np.uint64(0xBF58476D1CE4E5B9)
+        x ^= x >> np.uint64(27)
+        x *= np.uint64(0x94D049BB133111EB)
+        x ^= x >> np.uint64(31)
+    return x >> np.uint64(32)
+
+
+# Shingle hashes of a block of articles and the article (row in the block) each one comes from
+# Articles shorter than shingle_size words are represented by their single words instead
+def _shingles(texts, vocab, tokenizer, shingle_size):
+    ids, lengths = _encode(texts, vocab, tokenizer)
+    keys, doc = _ngram_keys(ids, lengths, shingle_size)
+    short = np.flatnonzero((lengths > 0) & (lengths < shingle_size))
+    if len(short):
+        words, word_doc = _ngram_keys(ids, lengths, 1)
+        keep = np.isin(word_doc, short)
+        keys, doc = np.concatenate([keys, words[keep]]), np.concatenate([doc, word_doc[keep]])
+        order = np.argsort(doc, kind = 'stable')
+        keys, doc = keys[order], doc[order]
+    return _mix(keys), doc
+
+
+# MinHash signature of every article, an (n_articles, num_perm) uint32 array
+# Articles without any word all get the same signature (EMPTY everywhere)
+def minhash_signatures(texts, num_perm = 128, shingle_size = 3, seed = 1, tokenizer = default_tokenizer,
+                       block_size = 2000):
+    texts = list(texts)
+    rng = np.random.RandomState(seed)
+    # h(x) = (a * x + b) >> 32 over 64 bits, one (a, b) pair per permutation (a odd)
+    high, low = rng.randint(0, 2 ** 32, (2, num_perm), dtype = np.uint64)
+    a = (high << np.uint64(32)) | low | np.uint64(1)
+    b = rng.randint(0, 2 ** 32, num_perm, dtype = np.uint64) << np.uint64(32)
+
+    signatures = np.full((len(texts), num_perm), EMPTY, dtype = np.uint32)
+    vocab = {}
+    for start in range(0, len(texts), block_size):
+        hashes, doc = _shingles(texts[start:start + block_size], vocab, tokenizer, shingle_size)
+        if len(hashes) == 0:
+            continue
+        # the shingles are grouped by article, reduceat takes the minimum of every group
+        rows, starts = np.unique(doc, return_index = True)
+        with np.errstate(over = 'ignore'):
+            for i in range(num_perm):
+                permuted = ((a[i] * hashes + b[i]) >> np.uint64(32)).astype(np.uint32)
+                signatures[start + rows, i] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+# Pairs of articles that land in the same bucket of at least one band, as (representative, article)
+# Every article of a bucket is paired with the first article of that bucket only, so a bucket of
+# k copies of the same story gives k - 1 pairs instead of k * (k - 1) / 2
+def _candidate_pairs(signatures, bands):
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    pairs = []
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        buckets = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        _, first, inverse = np.unique(buckets, return_index = True, return_inverse = True)
+        representative = first[inverse.ravel()]
+        docs = np.flatnonzero(representative != np.arange(n))
+        pairs.append(representative[docs] * n + docs)
+    pairs = np.unique(np.concatenate(pairs)) if pairs else np.empty(0, dtype = np.int64)
+    return pairs // n, pairs % n
+
+
+# Fraction of equal signature values of every pair, the estimate of their Jaccard similarity
+def _similarity(signatures, left, right, chunk_size = 100000):
+    similarity = np.empty(len(left))
+    for start in range(0, len(left), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        similarity[chunk] = (signatures[left[chunk]] == signatures[right[chunk]]).mean(axis = 1)
+    return similarity
+
+
+# Cluster id of every article from its MinHash signature, articles with the same id are near-duplicates
+# bands * rows = num_perm, articles with a similarity above about (1 / bands) ** (1 / rows) become
+# candidates (0.71 for 16 bands of 8 rows) and candidates are kept when their estimated similarity
+# is at least threshold. Cluster ids are numbered in the order of the first article of each cluster.
+def lsh_clusters(signatures, bands = 16, threshold = 0.8):
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError("num_perm (%d) has to be a multiple of bands (%d)" % (num_perm, bands))
+    left, right = _candidate_pairs(signatures, bands)
+    keep = _similarity(signatures, left, right) >= threshold
+    graph = coo_matrix((np.ones(keep.sum(), dtype = np.int8), (left[keep], right[keep])), shape = (n, n))
+    _, labels = connected_components(graph, directed = False)
+    # renumbering the clusters by their first article
+    _, first, inverse = np.unique(labels, return_index = True, return_inverse = True)
+    return np.argsort(np.argsort(first))[inverse.ravel()]
+
+
+def near_duplicate_clusters(texts, num_perm = 128, bands = 16, threshold = 0.8, shingle_size = 3, seed = 1):
+    signatures = minhash_signatures(texts, num_perm = num_perm, shingle_size = shingle_size, seed = seed)
+    return lsh_clusters(signatures, bands = bands, threshold = threshold)
+
+
+# Number of clusters (and articles in them) of every cluster size, singletons are articles without duplicates
+def cluster_sizes(clusters):
+    sizes = np.bincount(clusters)
+    table = pd.Series(sizes).value_counts().sort_index().rename_axis('cluster_size').to_frame('clusters')
+    table['articles'] = table.index * table['clusters']
+    return table
+
+
+# Boolean mask keeping the first article of every cluster (drop_duplicates for near-duplicates)
+def first_of_cluster(clusters):
+    return ~pd.Series(clusters).duplicated().to_numpy()
+
+
+def _take(data, idx):
+    return data.iloc[idx] if hasattr(data, 'iloc') else np.asarray(data)[idx]
+
+
+# Like sklearn's train_test_split, but all the articles of a cluster go to the same side so the test
+# set has no near-duplicates of training articles. test_size is the fraction of clusters in the test set.
+def group_train_test_split(*arrays, groups, test_size = 0.2, random_state = None):
+    splitter = GroupShuffleSplit(n_splits = 1, test_size = test_size, random_state = random_state)
+    train, test = next(splitter.split(np.zeros(len(groups)), groups = groups))
+    result = []
+    for data in arrays:
+        result += [_take(data, train), _take(data, test)]
+    return result
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Pretrained word vectors for the frozen Embedding layer of fakenews_model
+# The vectors are kept in gensim's own KeyedVectors format (a small .kv file plus a .npy array) and
+# opened with mmap, so only the rows of the words in the tokenizer vocabulary are actually read from
+# disk and several training processes share the same file in the page cache.
+# Vectors in word2vec / GloVe text or binary format are converted once with convert_vectors.
+
+import numpy as np
+from gensim.models import KeyedVectors
+
+
+# Converts word2vec format vectors (binary = False for text files, e.g. GloVe with a word2vec header)
+# into a KeyedVectors file that load_vectors can memory map
+def convert_vectors(source_path, kv_path, binary = True):
+    vectors = KeyedVectors.load_word2vec_format(source_path, binary = binary)
+    vectors.save(kv_path)
+    return kv_path
+
+
+# Opens the vectors saved by convert_vectors without reading the whole array into memory
+def load_vectors(kv_path):
+    return KeyedVectors.load(kv_path, mmap = 'r')
+
+
+# Row of every word in the vectors (gensim 4 has key_to_index, gensim 3 has vocab)
+def _word_rows(vectors):
+    if hasattr(vectors, 'key_to_index'):
+        return vectors.key_to_index
+    return {word: entry.index for word, entry in vectors.vocab.items()}
+
+
+# Weights for Embedding(max_features, ...): row i holds the vector of the word with id i in the
+# frozen tokenizer, only the first max_features - 1 words are looked up. Words without a vector get
+# small random values (like the Embedding layer's own initializer) and row 0 (padding) stays zero.
+# Returns the matrix and the fraction of the vocabulary that was found in the vectors.
+def embedding_matrix(vectors, frozen_tokenizer, max_features, seed = 42):
+    rows = _word_rows(vectors)
+    words = frozen_tokenizer.words[:max_features - 1]
+
+    rng = np.random.RandomState(seed)
+    matrix = rng.uniform(-0.05, 0.05, (max_features, vectors.vector_size)).astype(np.float32)
+    matrix[0] = 0
+
+    ids, found = [], []
+    for i, word in enumerate(words, 1):
+        row = rows.get(word)
+        if row is not None:
+            ids.append(i)
+            found.append(row)
+    if found:
+        # Reading the rows of the memory mapped array in file order, only the rows that are needed
+        order = np.argsort(found)
+        matrix[np.array(ids)[order]] = vectors.vectors[np.array(found)[order]]
+    return matrix, len(found) / max(len(words), 1)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Frozen copy of the fitted Keras Tokenizer, used to turn clean articles into padded sequences of word ids
+# Only the words the Tokenizer can actually output (ids 1 .. num_words - 1) are kept, and they are
+# saved to a small JSON file next to the model, so scoring does not have to fit the Tokenizer again.
+# encode_padded does texts_to_sequences and pad_sequences in one go and stops reading an article
+# as soon as it has maxlen words, giving the same ids as the fitted Tokenizer.
+
+import os
+import json
+
+import numpy as np
+
+
+# Same defaults as tensorflow.keras.preprocessing.text.Tokenizer
+KERAS_FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+
+
+class FrozenTokenizer:
+
+    def __init__(self, words, filters = KERAS_FILTERS, lower = True, split = ' '):
+        self.words = list(words)                 # words[i] has id i + 1 (0 is the padding id)
+        self.word_index = {word: i + 1 for i, word in enumerate(self.words)}
+        self.filters = filters
+        self.lower = lower
+        self.split = split
+        self._table = str.maketrans({c: split for c in filters})
+
+    # The words of a fitted Tokenizer(num_words = ...) that texts_to_sequences can return
+    @classmethod
+    def from_keras(cls, tokenizer):
+        last = len(tokenizer.word_index) + 1
+        if tokenizer.num_words:
+            last = min(last, tokenizer.num_words)
+        words = [tokenizer.index_word[i] for i in range(1, last)]
+        return cls(words, tokenizer.filters, tokenizer.lower, tokenizer.split)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+        with open(path, "w") as f:
+            json.dump({'filters': self.filters, 'lower': self.lower, 'split': self.split,
+                       'words': self.words}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['words'], data['filters'], data['lower'], data['split'])
+
+    # Same splitting as keras text_to_word_sequence
+    def text_to_words(self, text):
+        if self.lower:
+            text = text.lower()
+        return [word for word in text.translate(self._table).split(self.split) if word]
+
+    # Same as tokenizer.texts_to_sequences(texts), words that are not in the vocabulary are dropped
+    def encode(self, texts):
+        index = self.word_index
+        return [[index[word] for word in self.text_to_words(text) if word in index] for text in texts]
+
+    # Ids of the first (truncating = 'post') or last (truncating = 'pre') maxlen known words of an article,
+    # the rest of the article is not looked up
+    def encode_truncated(self, text, maxlen, truncating = 'post'):
+        index = self.word_index
+        words = self.text_to_words(text)
+        if truncating == 'pre':
+            words = reversed(words)
+        ids = []
+        for word in words:
+            idx = index.get(word)
+            if idx is not None:
+                ids.append(idx)
+                if len(ids) == maxlen:
+                    break
+        if truncating == 'pre':
+            ids.reverse()
+        return ids
+
+    # Same as pad_sequences(tokenizer.texts_to_sequences(texts), maxlen, padding = padding, truncating = truncating)
+    def encode_padded(self, texts, maxlen, padding = 'post', truncating = 'post', dtype = 'int32'):
+        texts = list(texts)
+        out = np.zeros((len(texts), maxlen), dtype = dtype)
+        for row, text in enumerate(texts):
+            ids = self.encode_truncated(text, maxlen, truncating)
+            if not ids:
+                continue
+            if padding == 'post':
+                out[row, :len(ids)] = ids
+            else:
+                out[row, maxlen - len(ids):] = ids
+        return out
+
+    # Length bucketed version of encode_padded (padding = 'post', truncating = 'post') for predictions:
+    # the articles are sorted by length and cut into batches of batch_size, every batch is padded only
+    # up to its own longest article (at least 1). Yields (rows, batch) where rows are the positions in
+    # texts of the articles in the batch.
+    def encode_batches(self, texts, maxlen, batch_size, dtype = 'int32'):
+        sequences = [self.encode_truncated(text, maxlen) for text in texts]
+        order = np.argsort([len(ids) for ids in sequences], kind = 'stable')
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            width = max(1, max(len(sequences[row]) for row in rows))
+            batch = np.zeros((len(rows), width), dtype = dtype)
+            for i, row in enumerate(rows):
+                batch[i, :len(sequences[row])] = sequences[row]
+            yield rows, batch
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Smaller versions of fakenews_model for scoring on CPU
+# - prune_embedding: drops the rows of the Embedding table for ids the tokenizer never outputs
+# - export_tflite: converts the model to TensorFlow Lite with dynamic range quantization
+#   (weights stored as int8, about 4x smaller than float32)
+# - parity_report: compares the smaller model against the float model on the test set
+
+import os
+import time
+
+import numpy as np
+
+
+TFLITE_FILE = "fakenews_model.tflite"
+
+
+# Copy of a Sequential model whose Embedding layer only has vocab_size rows
+# (frozen_tokenizer only outputs the ids 0 .. len(frozen_tokenizer.words), so any row after that is never used)
+def prune_embedding(model, vocab_size):
+    import tensorflow as tf
+    config = model.get_config()
+    weights = model.get_weights()
+    for layer, layer_config in zip(model.layers, [l for l in config['layers'] if l['class_name'] != 'InputLayer']):
+        if isinstance(layer, tf.keras.layers.Embedding):
+            if vocab_size >= layer.input_dim:
+                return model
+            layer_config['config']['input_dim'] = vocab_size
+            break
+    pruned = tf.keras.Sequential.from_config(config)
+    pruned.build(model.input_shape)
+    # the embedding table is the first weight of the model, the other weights are copied as they are
+    weights[0] = weights[0][:vocab_size]
+    pruned.set_weights(weights)
+    return pruned
+
+
+# Converts the model to a .tflite file, with every article padded to maxlength
+def export_tflite(model, path, maxlength, quantize = True):
+    import tensorflow as tf
+    run = tf.function(lambda x: model(x, training = False))
+    concrete = run.get_concrete_function(tf.TensorSpec([None, maxlength], tf.int32))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], model)
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+
+# Wraps a .tflite model with the predict_on_batch method FakeNewsPredictor uses,
+# so FakeNewsPredictor(TFLiteModel(path), frozen_tokenizer, maxlength) scores with the smaller model
+# The interpreter comes from the small tflite_runtime package when it is installed, else from tensorflow
+def _tflite_interpreter():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+
+    def __init__(self, path, num_threads = None):
+        self.interpreter = _tflite_interpreter()(model_path = path, num_threads = num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.shape = None
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch, dtype = self.input['dtype'])
+        if self.shape != batch.shape:
+            self.interpreter.resize_tensor_input(self.input['index'], batch.shape)
+            self.interpreter.allocate_tensors()
+            self.shape = batch.shape
+        self.interpreter.set_tensor(self.input['index'], batch)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output['index'])
+
+
+# Scores x (padded sequences) with both models and compares them
+def parity_report(float_model, small_model, x, y, batch_size = 256, threshold = 0.5):
+    def score(model):
+        start = time.perf_counter()
+        probabilities = np.concatenate([np.asarray(model.predict_on_batch(x[i:i + batch_size])).reshape(-1)
+                                        for i in range(0, len(x), batch_size)])
+        return probabilities, (time.perf_counter() - start) / max(len(x), 1)
+
+    y = np.asarray(y)
+    float_probabilities, float_seconds = score(float_model)
+    small_probabilities, small_seconds = score(small_model)
+    float_classes = (float_probabilities > threshold).astype(int)
+    small_classes = (small_probabilities > threshold).astype(int)
+    return {
+        'float_accuracy': float((float_classes == y).mean()),
+        'small_accuracy': float((small_classes == y).mean()),
+        'agreement': float((float_classes == small_classes).mean()),
+        'max_probability_difference': float(np.abs(float_probabilities - small_probabilities).max()),
+        'float_ms_per_article': float_seconds * 1000,
+        'small_ms_per_article': small_seconds * 1000,
+    }
+
+
+# Size of a file in MB
+def file_size_mb(path):
+    return os.path.getsize(path) / 2 ** 20
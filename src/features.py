@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Per-article feature extraction for the fake news articles
+
+import re
+
+import pandas as pd
+
+
+# Signals counted in every article, the patterns are compiled once when the module is imported
+signal_patterns = {
+    'mentions': re.compile(r'@([A-Za-z0-9_]+)'),   # twitter usernames
+    'hashtags': re.compile(r'#(\w+)'),
+    'urls': re.compile(r'http\S+'),
+    'bracket_tags': re.compile(r'\[[^]]*\]'),       # e.g. [Video], [Watch]
+    'html_tags': re.compile(r'<[^>]+>'),
+}
+
+
+# Number of matches of every signal in each article, one row per article and one column per signal.
+# Each column is counted with the pandas string methods over the whole Series, so a signal that
+# appears inside another one (a @mention inside a URL) is still counted for both.
+def article_signals(texts, signals = None):
+    if signals is None:
+        signals = list(signal_patterns)
+    counts = {name: texts.str.count(signal_patterns[name]) for name in signals}
+    return pd.DataFrame(counts, index = texts.index)
+
+
+# Function to count the total twitter username mentions
+def twitter_username_count(df):
+    return int(article_signals(df['text'], ['mentions'])['mentions'].sum())
+
+
+# Length statistics of every article, computed once so the plots and the maxlength choice can
+# read them from columns instead of tokenizing the articles again each time:
+# n_tokens - number of nltk tokens in the clean article, or the number of words of the article in corpus
+#            (a corpus.TokenCorpus of df['clean'], whose lengths are already known without tokenizing anything)
+# n_chars  - number of characters in the clean article
+# n_words  - number of whitespace separated words in the original text
+def token_stats(df, corpus = None):
+    stats = pd.DataFrame(index = df.index)
+    if corpus is not None:
+        stats['n_tokens'] = corpus.lengths()
+    else:
+        from nltk.tokenize import word_tokenize
+        from resources import require_nltk
+        require_nltk("punkt_tab", "punkt")
+        stats['n_tokens'] = [len(word_tokenize(article)) for article in df['clean']]
+    stats['n_chars'] = df['clean'].str.len()
+    stats['n_words'] = df['text'].str.split().str.len()
+    return stats
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Streaming version of the loading and cleaning steps of FakeNewsDetection.py
+# Instead of loading True.csv and Fake.csv completely, concatenating them and adding the
+# fullarticle and clean columns in memory, the CSVs are read a chunk at a time and every cleaned
+# chunk is appended straight to a parquet file. Only one chunk is in memory at any time, so the
+# memory use stays flat no matter how big the news feeds are.
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from preprocessing import clean_series, _mp_context
+
+
+# Columns of the parquet output, the same columns df_allnews ends up with in the notebook
+schema = pa.schema([
+    ('title', pa.string()),
+    ('text', pa.string()),
+    ('subject', pa.string()),
+    ('isfake', pa.int8()),
+    ('fullarticle', pa.string()),
+    ('clean', pa.string()),
+])
+
+
+# Label, combine and clean one chunk of articles, with the worker processes of executor if one is given
+def prepare_chunk(chunk, isfake, n_jobs = None, executor = None):
+    chunk = chunk.drop(columns = ['date'], errors = 'ignore')
+    chunk['isfake'] = isfake
+    chunk['fullarticle'] = chunk['title'] + ' ' + chunk['text']
+    chunk['clean'] = clean_series(chunk['fullarticle'], n_jobs = n_jobs, executor = executor)
+    return chunk[schema.names]
+
+
+# Reads every (csv_path, isfake) source in chunks of chunksize rows, cleans them and writes the
+# result to output_path. The rows end up in the same order as pd.concat([df_real, df_fake]).
+# Returns the number of articles written.
+# The cleaning processes are started once and reused for every chunk, instead of a new pool per chunk.
+def stream_clean_csvs(sources, output_path, chunksize = 5000, n_jobs = None):
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers = n_jobs, mp_context = _mp_context()) if n_jobs > 1 else None
+    rows = 0
+    try:
+        with pq.ParquetWriter(output_path, schema) as writer:
+            for csv_path, isfake in sources:
+                for chunk in pd.read_csv(csv_path, chunksize = chunksize):
+                    chunk = prepare_chunk(chunk, isfake, n_jobs, executor)
+                    writer.write_table(pa.Table.from_pandas(chunk, schema = schema, preserve_index = False))
+                    rows += len(chunk)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Clean the real and fake news CSVs into a parquet file, chunk by chunk")
+    parser.add_argument("output", help = "parquet file to write")
+    parser.add_argument("--real", default = "../data/True.csv", help = "CSV with the real news articles")
+    parser.add_argument("--fake", default = "../data/Fake.csv", help = "CSV with the fake news articles")
+    parser.add_argument("--chunksize", type = int, default = 5000, help = "number of rows read at a time")
+    parser.add_argument("--jobs", type = int, default = None, help = "number of cleaning processes (default: all cores)")
+    args = parser.parse_args()
+
+    total = stream_clean_csvs([(args.real, 0), (args.fake, 1)], args.output,
+                              chunksize = args.chunksize, n_jobs = args.jobs)
+    print("Wrote", total, "cleaned articles to", args.output)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Streaming tf.data input for training fakenews_model
+# The clean articles and their isfake labels are read from a parquet file a batch at a time,
+# turned into padded sequences of word ids inside the tf.data pipeline (with the vocabulary of the
+# FrozenTokenizer in a lookup table, so several batches are encoded in parallel) and prefetched
+# while the model trains on the previous batch. Nothing has to be tokenized up front or kept in memory.
+
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import tensorflow as tf
+
+
+# Writes the clean articles and labels of a split (e.g. x_train, y_train) to a parquet file for training_datasets
+def write_training_file(texts, labels, path):
+    pd.DataFrame({'clean': list(texts), 'isfake': np.asarray(labels, dtype = np.int8)}).to_parquet(path, index = False)
+
+
+# Yields (clean, isfake) for the rows start .. stop - 1 of the parquet file, reading it in batches
+def _read_rows(path, start, stop, read_size = 8192):
+    row = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size = read_size, columns = ['clean', 'isfake']):
+        texts = batch.column(0).to_pylist()
+        labels = batch.column(1).to_pylist()
+        for text, label in zip(texts, labels):
+            if row >= stop:
+                return
+            if row >= start:
+                yield text, label
+            row += 1
+
+
+# Character class matching the Tokenizer filters, for tf.strings.regex_replace
+def _filters_pattern(filters):
+    escaped = {'\t': '\\t', '\n': '\\n'}
+    return '[' + ''.join(escaped.get(c, '\\' + c) for c in filters) + ']'
+
+
+# tf function turning a batch of clean articles into the same padded ids as
+# frozen_tokenizer.encode_padded(texts, maxlen, padding = 'post', truncating = 'post')
+# With pad = False the ids are left as a ragged tensor (one row per article, at most maxlen ids)
+def make_encoder(frozen_tokenizer, maxlen, pad = True):
+    table = tf.lookup.StaticHashTable(
+        tf.lookup.KeyValueTensorInitializer(tf.constant(frozen_tokenizer.words),
+                                            tf.range(1, len(frozen_tokenizer.words) + 1, dtype = tf.int64)),
+        default_value = 0)
+    pattern = _filters_pattern(frozen_tokenizer.filters)
+
+    def encode(texts):
+        if frozen_tokenizer.lower:
+            texts = tf.strings.lower(texts, encoding = 'utf-8')
+        texts = tf.strings.regex_replace(texts, pattern, frozen_tokenizer.split)
+        words = tf.strings.split(texts, sep = frozen_tokenizer.split)
+        ids = tf.ragged.map_flat_values(table.lookup, words)
+        # empty strings and words outside the vocabulary both look up to 0 and are dropped
+        ids = tf.cast(tf.ragged.boolean_mask(ids, ids > 0)[:, :maxlen], tf.int32)
+        if not pad:
+            return ids
+        return ids.to_tensor(default_value = 0, shape = [None, maxlen])
+
+    return encode
+
+
+# Bucket boundaries for bucketed batches: 16, 32, 64, ... up to maxlen
+def default_boundaries(maxlen):
+    boundaries = []
+    length = 16
+    while length < maxlen:
+        boundaries.append(length)
+        length *= 2
+    return boundaries
+
+
+# Shuffles (optionally), batches and encodes a dataset of (clean, isfake) pairs
+# bucketed = False pads every article to maxlen.
+# bucketed = True groups articles of similar length (see default_boundaries) and pads every batch only
+# up to its longest article (at least 1 id, so a batch of empty articles is not 0 ids wide).
+# The model should then be built with mask_zero = True, so the padding of a batch does not change the scores.
+# The padding is always added at the end ('post'), like for x_train.
+def _batches(ds, frozen_tokenizer, maxlen, batch_size, shuffle, shuffle_buffer, seed, bucketed):
+    if shuffle:
+        ds = ds.shuffle(shuffle_buffer, seed = seed, reshuffle_each_iteration = True)
+    if not bucketed:
+        encode = make_encoder(frozen_tokenizer, maxlen)
+        ds = ds.batch(batch_size)
+        ds = ds.map(lambda texts, labels: (encode(texts), labels), num_parallel_calls = tf.data.AUTOTUNE)
+    else:
+        encode = make_encoder(frozen_tokenizer, maxlen, pad = False)
+        boundaries = default_boundaries(maxlen)
+        ds = ds.batch(1024)
+        ds = ds.map(lambda texts, labels: (encode(texts), labels), num_parallel_calls = tf.data.AUTOTUNE)
+        ds = ds.unbatch()
+        ds = ds.bucket_by_sequence_length(lambda ids, label: tf.shape(ids)[0], boundaries,
+                                          [batch_size] * (len(boundaries) + 1))
+        ds = ds.map(lambda ids, labels: (tf.pad(ids, [[0, 0], [0, tf.maximum(1 - tf.shape(ids)[1], 0)]]), labels))
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+# Training and validation datasets read from a parquet file written by write_training_file
+# Like fit(..., validation_split = validation_split) the last validation_split of the rows are used
+# for validation (the split row is rounded down, as Keras does), and the training rows are shuffled every epoch.
+def training_datasets(path, frozen_tokenizer, maxlen, batch_size = 64, validation_split = 0.1,
+                      shuffle_buffer = 10000, seed = None, bucketed = False):
+    num_rows = pq.ParquetFile(path).metadata.num_rows
+    split_at = int(math.floor(num_rows * (1 - validation_split)))
+    signature = (tf.TensorSpec(shape = (), dtype = tf.string), tf.TensorSpec(shape = (), dtype = tf.int32))
+
+    def dataset(start, stop, shuffle):
+        ds = tf.data.Dataset.from_generator(lambda: _read_rows(path, start, stop), output_signature = signature)
+        return _batches(ds, frozen_tokenizer, maxlen, batch_size, shuffle, shuffle_buffer, seed, bucketed)
+
+    return dataset(0, split_at, True), dataset(split_at, num_rows, False)
+
+
+# Same as training_datasets, for clean articles and labels that are already in memory (x_train_text, y_train)
+def array_datasets(texts, labels, frozen_tokenizer, maxlen, batch_size = 64, validation_split = 0.1,
+                   shuffle_buffer = 10000, seed = None, bucketed = False):
+    texts = list(texts)
+    labels = np.asarray(labels, dtype = np.int32)
+    split_at = int(math.floor(len(texts) * (1 - validation_split)))
+
+    def dataset(start, stop, shuffle):
+        ds = tf.data.Dataset.from_tensor_slices((texts[start:stop], labels[start:stop]))
+        return _batches(ds, frozen_tokenizer, maxlen, batch_size, shuffle, shuffle_buffer, seed, bucketed)
+
+    return dataset(0, split_at, True), dataset(split_at, len(texts), False)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# The Bi-Directional LSTM used to classify the articles (fakenews_model in FakeNewsDetection.py)
+
+from tensorflow.keras.models import Sequential
+from tensorflow.keras.layers import Dense, Embedding, Bidirectional, LSTM
+
+
+# maxlength = None lets the length of the articles change from batch to batch (bucketed batches)
+# mask_zero = True makes the LSTM skip the padding (id 0), so the score of an article does not depend on how
+# much padding it gets. Needed with bucketed batches, where the padding changes with the other articles of the batch.
+def build_fakenews_model(max_features, embedding_size = 128, maxlength = None, embeddings_initializer = 'uniform',
+                         optimizer = 'adam', mask_zero = False):
+    #Defining the Neural Network by initializing the sequential model
+    model = Sequential()
+
+    # Adding the non-trainable embedding layer
+    model.add(Embedding(max_features, output_dim = embedding_size, embeddings_initializer = embeddings_initializer,
+                        input_length = maxlength, mask_zero = mask_zero, trainable = False))
+
+    # Building a Bi-Directional RNN and LSTM model
+    model.add(Bidirectional(LSTM(128)))
+
+    # Adding Dense layers
+    model.add(Dense(128, activation = 'relu')) # adding 128 dense layers with relu activation
+    # Output is only 1 neuron, why? Essentially doing binary classification with an output of 0 or 1
+    model.add(Dense(1, activation = 'sigmoid')) # adding dense of 1 neuron with sigmoid activation
+    # Building the model creates the weights now (Keras 3 ignores input_length), so the embedding
+    # weights can be set right away, e.g. with pretrained vectors
+    model.build((None, maxlength))
+    # compiling model with adam optimizer and binary crossentropy loss with metrics being accuracy
+    model.compile(optimizer = optimizer, loss = 'binary_crossentropy', metrics = ['accuracy'])
+    return model
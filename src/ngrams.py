@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# N-gram counting for the fake news articles
+# Every word gets an integer id and an n-gram (up to 3 words) is packed into a single 64 bit
+# integer (21 bits per word). Counting is then just np.unique over integer arrays, done for all
+# the requested n-gram orders and both classes (isfake = 0/1) in the same pass over the articles,
+# without keeping a Python string for every n-gram of the corpus around.
+
+import re
+
+import numpy as np
+
+
+# Same default token pattern as CountVectorizer, so the top n-grams match the old top_ngrams
+default_tokenizer = re.compile(r"(?u)\b\w\w+\b").findall
+
+ID_BITS = 21
+MAX_ORDER = 64 // ID_BITS
+# Words seen after the vocabulary is full (2 ** 21 - 1 words) all share this id
+OTHER = (1 << ID_BITS) - 1
+
+
+# Turns a block of articles into one flat array of word ids plus the number of words per article
+def _encode(texts, vocab, tokenizer):
+    ids = []
+    lengths = np.empty(len(texts), dtype = np.int64)
+    for i, text in enumerate(texts):
+        words = tokenizer(text)
+        lengths[i] = len(words)
+        for word in words:
+            idx = vocab.get(word)
+            if idx is None:
+                idx = len(vocab) if len(vocab) < OTHER else OTHER
+                if idx != OTHER:
+                    vocab[word] = idx
+            ids.append(idx)
+    return np.array(ids, dtype = np.int64), lengths
+
+
+# Packs every run of g word ids into one integer key, dropping runs that cross two articles
+# Returns the keys and the article (row in the block) each key comes from
+def _ngram_keys(ids, lengths, g):
+    n = len(ids) - g + 1
+    if n <= 0:
+        return np.empty(0, dtype = np.int64), np.empty(0, dtype = np.int64)
+    keys = ids[:n].copy()
+    for j in range(1, g):
+        keys = (keys << ID_BITS) | ids[j:j + n]
+    doc = np.repeat(np.arange(len(lengths)), lengths)
+    valid = doc[:n] == doc[g - 1:g - 1 + n]
+    return keys[valid], doc[:n][valid]
+
+
+# Adds up the counts of keys that appear more than once, counts has one column per class
+def _sum_by_key(keys, counts):
+    ukeys, inverse = np.unique(keys, return_inverse = True)
+    summed = np.zeros((len(ukeys), counts.shape[1]), dtype = np.int64)
+    for c in range(counts.shape[1]):
+        summed[:, c] = np.bincount(inverse, weights = counts[:, c], minlength = len(ukeys))
+    return ukeys, summed
+
+
+# Keeps only the max_ngrams most frequent keys, so the memory stays bounded on big corpora
+# (the counts of n-grams that were dropped and seen again later start over from that point)
+def _prune(keys, counts, max_ngrams):
+    if max_ngrams is None or len(keys) <= max_ngrams:
+        return keys, counts
+    keep = np.sort(np.argpartition(-counts.sum(axis = 1), max_ngrams - 1)[:max_ngrams])
+    return keys[keep], counts[keep]
+
+
+# Counts of every n-gram order for each class, returned by count_ngrams
+class NgramCounts:
+
+    def __init__(self, words, classes, counts):
+        self.words = words          # id -> word
+        self.classes = classes      # class label of every count column
+        self.counts = counts        # order -> (keys, counts[n_keys, n_classes])
+
+    # Turns a packed key back into the words of the n-gram
+    def decode(self, key, g):
+        key = int(key)
+        ids = [(key >> (ID_BITS * (g - 1 - j))) & OTHER for j in range(g)]
+        return ' '.join(self.words[i] if i != OTHER else '<other>' for i in ids)
+
+    # The n most common n-grams of order g as (ngram, count) pairs, most common first
+    # isfake = None counts all articles, isfake = 0/1 only the real/fake ones
+    def top(self, g, n = 10, isfake = None):
+        keys, counts = self.counts[g]
+        if isfake is None:
+            column = counts.sum(axis = 1)
+        else:
+            column = counts[:, self.classes.index(isfake)]
+        k = min(n, len(column))
+        if k == 0:
+            return []
+        # argpartition only has to find the top k, the k winners are then sorted
+        idx = np.argpartition(-column, k - 1)[:k]
+        idx = idx[np.argsort(-column[idx], kind = 'stable')]
+        return [(self.decode(keys[i], g), int(column[i])) for i in idx]
+
+
+# Adds the n-grams of one block of articles (flat word ids and number of words per article) to counts
+# block_labels is the class column of every article of the block
+def _add_block(counts, ids, lengths, block_labels, n_classes, max_ngrams):
+    for g in counts:
+        keys, doc = _ngram_keys(ids, lengths, g)
+        keys, inverse = np.unique(keys, return_inverse = True)
+        block_counts = np.bincount(inverse * n_classes + block_labels[doc],
+                                   minlength = len(keys) * n_classes).reshape(-1, n_classes)
+        old_keys, old_counts = counts[g]
+        merged = _sum_by_key(np.concatenate([old_keys, keys]), np.vstack([old_counts, block_counts]))
+        counts[g] = _prune(*merged, max_ngrams)
+
+
+# Counts all the n-gram orders in one pass over the articles (block_size articles at a time)
+# labels gives the class of every article (e.g. df.isfake) to also get per class counts
+# tokenizer splits an article into words (CountVectorizer's token pattern by default, str.split also works)
+# max_ngrams bounds how many distinct n-grams of each order are kept in memory
+def count_ngrams(texts, labels = None, orders = (1, 2, 3), tokenizer = default_tokenizer,
+                 block_size = 10000, max_ngrams = 5000000):
+    if max(orders) > MAX_ORDER:
+        raise ValueError("n-grams of more than %d words are not supported" % MAX_ORDER)
+
+    texts = list(texts)
+    if labels is None:
+        labels = np.zeros(len(texts), dtype = np.int64)
+    labels = np.asarray(labels)
+    classes = sorted(np.unique(labels).tolist())
+    label_idx = np.searchsorted(classes, labels)
+
+    vocab = {}
+    counts = {g: (np.empty(0, dtype = np.int64), np.zeros((0, len(classes)), dtype = np.int64)) for g in orders}
+
+    for start in range(0, len(texts), block_size):
+        ids, lengths = _encode(texts[start:start + block_size], vocab, tokenizer)
+        _add_block(counts, ids, lengths, label_idx[start:start + block_size], len(classes), max_ngrams)
+
+    words = [None] * len(vocab)
+    for word, idx in vocab.items():
+        words[idx] = word
+    return NgramCounts(words, classes, counts)
+
+
+# A function to return the most common n-grams, (ngram, count) pairs for the n most common g-grams
+def top_ngrams(corpus, n, g):
+    return count_ngrams(corpus, orders = (g,)).top(g, n)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Scoring articles with the trained fakenews_model
+# The model, the frozen tokenizer and the settings they were trained with are saved together in one
+# folder (save_model_artifacts) and loaded once by FakeNewsPredictor, which can then score any
+# number of articles: pre_clean -> encode and pad -> model in micro-batches.
+
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from preprocessing import pre_clean
+from encoding import FrozenTokenizer
+
+
+MODEL_FILE = "fakenews_model.keras"
+TOKENIZER_FILE = "tokenizer.json"
+CONFIG_FILE = "config.json"
+
+
+# Saves everything FakeNewsPredictor.load needs into model_dir
+def save_model_artifacts(model_dir, model, frozen_tokenizer, maxlength, dynamic_padding = False):
+    os.makedirs(model_dir, exist_ok = True)
+    model.save(os.path.join(model_dir, MODEL_FILE))
+    frozen_tokenizer.save(os.path.join(model_dir, TOKENIZER_FILE))
+    with open(os.path.join(model_dir, CONFIG_FILE), "w") as f:
+        json.dump({'maxlength': maxlength, 'dynamic_padding': dynamic_padding}, f)
+
+
+# True when the first layer of the model masks the padding (Embedding(mask_zero = True))
+def _masks_padding(model):
+    layers = getattr(model, 'layers', None)
+    return bool(layers) and getattr(layers[0], 'mask_zero', False)
+
+
+class FakeNewsPredictor:
+
+    # dynamic_padding = True pads every micro-batch only up to its longest article
+    # (for models trained with bucketed_batches), otherwise every article is padded to maxlength.
+    # Only models that mask the padding get the same score for any padding, for the others the score of an
+    # article would depend on the other articles of its micro-batch, so they are always padded to maxlength.
+    def __init__(self, model, frozen_tokenizer, maxlength, batch_size = 256, dynamic_padding = False):
+        self.model = model
+        self.tokenizer = frozen_tokenizer
+        self.maxlength = maxlength
+        self.batch_size = batch_size
+        self.dynamic_padding = dynamic_padding and _masks_padding(model)
+
+    # Loads the model saved with save_model_artifacts, meant to be done once per process
+    # tflite = True loads the smaller TensorFlow Lite model written by export.export_tflite instead
+    # (it always pads the articles to maxlength), which does not need to import all of tensorflow
+    @classmethod
+    def load(cls, model_dir, batch_size = 256, tflite = False):
+        with open(os.path.join(model_dir, CONFIG_FILE)) as f:
+            config = json.load(f)
+        if tflite:
+            from export import TFLITE_FILE, TFLiteModel
+            model = TFLiteModel(os.path.join(model_dir, TFLITE_FILE))
+        else:
+            import tensorflow as tf
+            model = tf.keras.models.load_model(os.path.join(model_dir, MODEL_FILE))
+        frozen_tokenizer = FrozenTokenizer.load(os.path.join(model_dir, TOKENIZER_FILE))
+        return cls(model, frozen_tokenizer, config['maxlength'], batch_size = batch_size,
+                   dynamic_padding = config.get('dynamic_padding', False))
+
+    # Padded micro-batches of the clean articles as (rows, batch) pairs
+    def _batches(self, texts):
+        if self.dynamic_padding:
+            yield from self.tokenizer.encode_batches(texts, self.maxlength, self.batch_size)
+            return
+        padded = self.tokenizer.encode_padded(texts, self.maxlength, padding = 'post', truncating = 'post')
+        for start in range(0, len(padded), self.batch_size):
+            yield np.arange(start, min(start + self.batch_size, len(padded))), padded[start:start + self.batch_size]
+
+    # Probability of every article being fake (isfake = 1)
+    # clean = False skips pre_clean, for articles that are already cleaned (e.g. X_test_text)
+    def predict(self, texts, clean = True):
+        texts = [pre_clean(text) for text in texts] if clean else list(texts)
+        probabilities = np.zeros(len(texts), dtype = np.float32)
+        for rows, batch in self._batches(texts):
+            probabilities[rows] = np.asarray(self.model.predict_on_batch(batch)).reshape(-1)
+        return probabilities
+
+    # 1 (fake) when the probability is above the threshold, else 0 (real)
+    def predict_classes(self, texts, threshold = 0.5, clean = True):
+        return (self.predict(texts, clean = clean) > threshold).astype(int)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Print the probability of every article (one per line on stdin) being fake")
+    parser.add_argument("--model-dir", default = "../models", help = "folder written by save_model_artifacts")
+    parser.add_argument("--batch-size", type = int, default = 256, help = "number of articles per model call")
+    parser.add_argument("--tflite", action = "store_true", help = "score with the quantized TensorFlow Lite model")
+    args = parser.parse_args()
+
+    predictor = FakeNewsPredictor.load(args.model_dir, batch_size = args.batch_size, tflite = args.tflite)
+    for probability in predictor.predict(sys.stdin.read().splitlines()):
+        print("%.6f" % probability)
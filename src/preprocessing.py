@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Text cleaning helpers for the fake news articles.
+# These live in their own module (instead of inside FakeNewsDetection.py) so that
+# worker processes can import pre_clean when the cleaning is spread over several cores.
+
+import os
+import re
+import hashlib
+import string
+import multiprocessing
+from itertools import chain
+from collections import Counter
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from resources import require_nltk, nltk_words
+
+
+# Version of the cleaning pipeline, bump it whenever pre_clean starts giving a different output
+# so that articles cleaned by an older version are not reused from the clean cache
+CLEAN_VERSION = "3"
+
+# Stopwords (and wordnet for the lemmatizer) have to be installed locally, see resources.py
+require_nltk("stopwords")
+require_nltk("wordnet")
+
+# Adding stopwords (read straight from the nltk_data folder, the same words as stopwords.words('english'))
+stop_words = set(nltk_words('stopwords', 'english'))
+
+# Adding punctuation to the stopwords list
+punctuation = list(string.punctuation)
+stop_words.update(punctuation)
+
+
+# Remove html elements
+# bs4 is only imported once an article actually contains html (see normalize)
+def remove_html(text):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, "html.parser")
+    return soup.get_text()
+
+# Remove square brackets with Regular Expression
+def remove_square_brackets(text):
+    return re.sub(r'\[[^]]*\]', '', text)
+
+# Remove URLs with Regular Expression
+def remove_urls(text):
+    return re.sub(r'http\S+', '', text)
+
+def lowercase(text):
+    return text.lower()
+
+def remove_stopwords(text):
+    final_text = []
+    for i in text.split():
+        if i.strip().lower() not in stop_words:
+            final_text.append(i.strip())
+    return " ".join(final_text)
+
+# One lemmatizer for the whole process instead of a new one on every call
+# nltk is only imported when the first word is lemmatized, so importing this module stays fast
+@lru_cache(maxsize = None)
+def _lemmatizer():
+    from nltk.stem import WordNetLemmatizer
+    return WordNetLemmatizer()
+
+# Most of the vocabulary repeats across articles, so the word -> lemma lookups are memoized
+# (bounded, least recently used words are dropped first)
+LEMMA_CACHE_SIZE = 2 ** 18
+
+@lru_cache(maxsize = LEMMA_CACHE_SIZE)
+def lemmatize_word(word):
+    return _lemmatizer().lemmatize(word)
+
+# Lemmatize every word of the article (not the whole article as if it was one word)
+def lemmatize(text):
+    return " ".join(map(lemmatize_word, text.split()))
+
+# Hits and misses of the lemma caches of the worker processes, added up by clean_series
+_worker_lemma_stats = Counter()
+
+# Hits, misses and current size of the lemma cache
+# The hits and misses also count the lookups done in the worker processes of clean_series (where the
+# articles are lemmatized by default), the size is the one of this process's cache
+def lemma_cache_info():
+    info = lemmatize_word.cache_info()
+    return info._replace(hits = info.hits + _worker_lemma_stats['hits'],
+                         misses = info.misses + _worker_lemma_stats['misses'])
+
+
+
+# Square brackets and URLs removed with a single precompiled Regular Expression
+# The URL part also swallows any bracket groups inside it (and allows them between the letters of
+# "http"), because remove_square_brackets runs before remove_urls in the original chain and
+# would have joined those pieces into one URL. A '[' with no closing ']' after it is kept as text.
+_BRACKETS = r'\[[^]]*\]'
+_URL_CHAR = r'(?:[^\s\[]|\[(?![^]]*\]))'
+_BRACKETS_AND_URLS = re.compile(
+    r'{b}|h(?:{b})*t(?:{b})*t(?:{b})*p(?:{b})*{c}(?:{c}|{b})*'.format(b = _BRACKETS, c = _URL_CHAR))
+
+# Single pass replacement for remove_html -> remove_square_brackets -> remove_urls -> lowercase
+# Most articles have no markup at all, so BeautifulSoup is only used when the text contains a '<'
+# (a tag) or a '&' (an html entity such as &amp; which get_text also decodes).
+def normalize(text):
+    if '<' in text or '&' in text:
+        text = remove_html(text)
+    return _BRACKETS_AND_URLS.sub('', text).lower()
+
+# Pre-cleaning of text
+# Same output as remove_html, remove_square_brackets, remove_urls, lowercase, remove_stopwords
+# and lemmatize applied one after the other
+def pre_clean(text):
+    text = normalize(text)
+    text = remove_stopwords(text)
+    text = lemmatize(text)
+    return text
+
+
+# Cleans one chunk of articles inside a worker process
+# Also returns the lemma cache hits and misses of the chunk, the counters of a worker are not seen otherwise
+def _clean_chunk(texts):
+    before = lemmatize_word.cache_info()
+    cleaned = [pre_clean(text) for text in texts]
+    after = lemmatize_word.cache_info()
+    return cleaned, after.hits - before.hits, after.misses - before.misses
+
+# Start method of the cleaning processes: fork where the platform has it, so the workers start from a copy
+# of the calling process and do not import __main__ again. FakeNewsDetection.py calls clean_series at the
+# top level of the script without an if __name__ == "__main__" guard, which spawn and forkserver (the
+# default on macOS, Windows and newer Pythons) would run again in every worker.
+def _mp_context():
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+# Batch version of df['fullarticle'].apply(pre_clean)
+# The articles are split into chunks, each chunk is cleaned in a separate process and the
+# results are put back together in the original order, so the output is the same as the serial apply.
+# n_jobs = None uses every core, n_jobs = 1 falls back to the plain serial apply.
+# mp_context = None uses _mp_context(), scripts with a main guard can pass any multiprocessing context.
+# Callers cleaning many batches (ingest.py) can pass their own executor, which is reused and left open.
+def clean_series(texts, n_jobs = None, chunksize = None, mp_context = None, executor = None):
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    values = texts.tolist()
+
+    if n_jobs <= 1 or len(values) <= 1:
+        return texts.apply(pre_clean)
+
+    # A few chunks per worker keeps the cores busy when some chunks have longer articles
+    if chunksize is None:
+        chunksize = max(1, -(-len(values) // (n_jobs * 4)))
+    chunks = [values[i:i + chunksize] for i in range(0, len(values), chunksize)]
+
+    # Executor.map yields the results in the same order as the chunks were submitted
+    if executor is not None:
+        results = list(executor.map(_clean_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers = n_jobs, mp_context = mp_context or _mp_context()) as pool:
+            results = list(pool.map(_clean_chunk, chunks))
+    cleaned = list(chain.from_iterable(chunk for chunk, _, _ in results))
+    for _, hits, misses in results:
+        _worker_lemma_stats['hits'] += hits
+        _worker_lemma_stats['misses'] += misses
+
+    return pd.Series(cleaned, index = texts.index, name = texts.name)
+
+
+# Content address of an article in the clean cache: a hash of the cleaning version and the raw text
+def article_key(text):
+    return hashlib.blake2b((CLEAN_VERSION + "\0" + text).encode("utf-8"), digest_size = 16).hexdigest()
+
+# Same as clean_series, but keeps the cleaned articles in a parquet file between runs.
+# Only articles that are new (or changed, or cleaned by an older CLEAN_VERSION) are cleaned,
+# everything else is read back from the cache. The file is rewritten with just the articles
+# of the current data so it does not keep growing with articles that were dropped.
+def cached_clean_series(texts, cache_path, n_jobs = None):
+    keys = texts.map(article_key)
+
+    if os.path.exists(cache_path):
+        cache = pd.read_parquet(cache_path).set_index('key')['clean']
+        cache = cache[~cache.index.duplicated()]
+    else:
+        cache = pd.Series(dtype = object, name = 'clean')
+
+    missing = ~keys.isin(cache.index)
+    if missing.any():
+        # Articles that appear more than once only need to be cleaned once
+        todo = ~keys.duplicated() & missing
+        cleaned = clean_series(texts[todo], n_jobs = n_jobs)
+        cache = pd.concat([cache, pd.Series(cleaned.values, index = keys[todo].values, name = 'clean')])
+
+    current = cache[cache.index.isin(keys)]
+    if missing.any() or len(current) != len(cache):
+        current.index.name = 'key'
+        tmp_path = cache_path + ".tmp"
+        current.reset_index().to_parquet(tmp_path, index = False)
+        os.replace(tmp_path, cache_path)
+
+    return pd.Series(current.reindex(keys.values).values, index = texts.index, name = texts.name)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Timing and memory use of the named stages of the pipeline (loading, cleaning, n-grams, training, ...)
+#
+#   profiler = StageProfiler()
+#   with profiler.stage("pre_clean", rows = len(df_allnews)):
+#       df_allnews['clean'] = ...
+#   profiler.save("../reports/stage_profile.json")
+#
+# Every stage records its wall time, CPU time (including worker processes that finished during the
+# stage), peak memory (RSS) of this process and of its largest worker process, and rows per second.
+# A disabled profiler does nothing at all, so the stages can stay wrapped in the notebook.
+# No thread is used to measure the memory: stages like pre_clean fork worker processes, and forking
+# while another thread runs can deadlock the workers.
+
+import os
+import json
+import time
+import resource
+import platform
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Current memory use (RSS) of this process in bytes, None if it cannot be read
+def current_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+# Highest memory use (RSS) so far in bytes (ru_maxrss is in KB on Linux, bytes on macOS), of this process
+# or, with who = resource.RUSAGE_CHILDREN, of the largest of its worker processes that have finished
+def max_rss(who = resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+# Linux can start the peak RSS of this process (VmHWM) over from the current RSS by writing 5 to
+# /proc/self/clear_refs, which gives the exact peak of one stage. Returns False where that is not possible.
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+# Peak RSS of this process in bytes since the last reset_peak_rss (VmHWM), None if it cannot be read
+def peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _cpu_seconds():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class StageProfiler:
+
+    def __init__(self, enabled = True):
+        self.enabled = enabled
+        self.stages = []
+
+    # Records one stage, rows is the number of articles (or other items) the stage processes
+    @contextmanager
+    def stage(self, name, rows = None):
+        if not self.enabled:
+            yield
+            return
+        rss_start = current_rss()
+        max_rss_start = max_rss()
+        children_max_rss_start = max_rss(resource.RUSAGE_CHILDREN)
+        exact_peak = reset_peak_rss() and peak_rss() is not None
+        cpu_start = _cpu_seconds()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = _cpu_seconds() - cpu_start
+            if exact_peak:
+                peak = peak_rss()
+            else:
+                # Without a resettable peak only the RSS at the start and the end of the stage are known,
+                # plus the process wide peak when it was reached during this stage
+                peak = max(rss_start or 0, current_rss() or 0)
+                if max_rss() > max_rss_start or rss_start is None:
+                    peak = max(peak, max_rss())
+            # Largest worker process that finished during the stage (e.g. the cleaning workers)
+            children_peak = max_rss(resource.RUSAGE_CHILDREN)
+            self.stages.append({
+                'stage': name,
+                'wall_s': wall,
+                'cpu_s': cpu,
+                'rss_start_mb': rss_start / 2 ** 20 if rss_start is not None else None,
+                'peak_rss_mb': peak / 2 ** 20,
+                'worker_peak_rss_mb': children_peak / 2 ** 20 if children_peak > children_max_rss_start else None,
+                'rows': rows,
+                'rows_per_s': rows / wall if rows and wall > 0 else None,
+            })
+
+    def report(self):
+        return list(self.stages)
+
+    def save(self, path):
+        if not self.enabled:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+        with open(path, "w") as f:
+            json.dump({'created': time.strftime("%Y-%m-%dT%H:%M:%S"), 'stages': self.stages}, f, indent = 2)
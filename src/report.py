@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Headless EDA report: every figure of the notebook's EDA part written to a file (PNG, or HTML for
+# the plotly ones) instead of being shown inline, plus an index.html that shows them all.
+#
+#   python report.py --output ../reports/eda
+#
+# The statistics the figures need (class and subject counts, length histograms, word and n-gram
+# counts) are computed once in the main process by report_figures. The figures are then drawn by a
+# pool of worker processes, each one only gets the small precomputed inputs of its own figure.
+# manifest.json keeps a hash of the inputs of every figure, so a rerun after a data drop only draws
+# again the figures whose inputs changed.
+
+import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# Bump whenever a figure starts looking different, so all figures are drawn again
+REPORT_VERSION = "1"
+MANIFEST_FILE = "manifest.json"
+
+
+# Countplot of the number of real and fake articles
+def _class_counts(inputs, path):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.figure(figsize = (8, 8))
+    ax = sns.barplot(x = inputs['isfake'], y = inputs['count'])
+    ax.set_title("The number of real vs fake articles countplot")
+    ax.set(xlabel = "Article Type", ylabel = "count")
+    plt.savefig(path, bbox_inches = 'tight')
+
+
+# Countplot of the subjects, split by isfake
+def _subject_counts(inputs, path):
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.figure(figsize = (10, 10))
+    sns.set(style = "whitegrid", font_scale = 1.2)
+    ax = sns.barplot(data = pd.DataFrame(inputs), x = "subject", y = "count", hue = "isfake")
+    ax.set_xticklabels(ax.get_xticklabels(), rotation = 60, horizontalalignment = 'right')
+    ax.set_title("Breakdown of the subject matter of all articles countplot")
+    ax.set(xlabel = "Subject of Article", ylabel = "Count")
+    plt.savefig(path, bbox_inches = 'tight')
+
+
+def _wordcloud(inputs, path):
+    from PIL import Image
+    from wordclouds import wordcloud_image
+    image = wordcloud_image(dict(inputs['words']), inputs['cache_dir'], max_words = inputs['max_words'],
+                            mask_path = inputs['mask_path'], **inputs['params'])
+    Image.fromarray(image).save(path)
+
+
+# Plotly histogram of the number of tokens per article, drawn from the precomputed bin counts
+def _token_histogram(inputs, path):
+    import plotly.graph_objects as go
+    edges = np.array(inputs['edges'])
+    fig = go.Figure(go.Bar(x = (edges[:-1] + edges[1:]) / 2, y = inputs['counts'], width = np.diff(edges)))
+    fig.update_layout(title = 'Distribution of Total Number of Words Per Article',
+                      xaxis_title = 'Number of Words Per Article', yaxis_title = 'count', bargap = 0)
+    fig.write_html(path, include_plotlyjs = 'cdn')
+
+
+# Real and fake histograms side by side, drawn from the precomputed bin counts
+def _class_histograms(inputs, path):
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(1, 2, figsize = (12, 8))
+    for ax, isfake, color, title in zip(axes, ('0', '1'), ('green', 'red'), inputs['titles']):
+        edges, counts = inputs['histograms'][isfake]
+        ax.hist(edges[:-1], edges, weights = counts, color = color)
+        ax.set_title(title)
+    fig.suptitle(inputs['suptitle'])
+    fig.savefig(path, bbox_inches = 'tight')
+
+
+# Plotly bar chart of the top words of one class
+def _top_words(inputs, path):
+    import plotly.graph_objects as go
+    words, counts = zip(*inputs['words']) if inputs['words'] else ((), ())
+    fig = go.Figure(data = [go.Bar(x = list(words), y = list(counts), marker = dict(color = list(counts)))],
+                    layout = go.Layout(title = inputs['title'], yaxis_title = 'Count', xaxis_title = 'Word',
+                                       plot_bgcolor = 'rgba(0,0,0,0)'))
+    fig.write_html(path, include_plotlyjs = 'cdn')
+
+
+def _ngram_bars(inputs, path):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.figure(figsize = (16, 9))
+    chart = dict(inputs['ngrams'])
+    chart = sns.barplot(x = list(chart.keys()), y = list(chart.values()))
+    chart.set_xticklabels(chart.get_xticklabels(), rotation = 45, horizontalalignment = 'right')
+    chart.set_title(inputs['title'])
+    plt.savefig(path, bbox_inches = 'tight')
+
+
+# The workers get the name of the renderer, not the function
+RENDERERS = {
+    'class_counts': _class_counts,
+    'subject_counts': _subject_counts,
+    'wordcloud': _wordcloud,
+    'token_histogram': _token_histogram,
+    'class_histograms': _class_histograms,
+    'top_words': _top_words,
+    'ngram_bars': _ngram_bars,
+}
+
+
+def _histograms(values, isfake, bins = 10):
+    histograms = {}
+    for label in (0, 1):
+        counts, edges = np.histogram(values[isfake == label], bins = bins)
+        histograms[str(label)] = [edges.tolist(), counts.tolist()]
+    return histograms
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+# Every figure of the report as {file name: (renderer, inputs)}, computed from
+# df (with isfake, subject and the n_tokens / n_chars / n_words columns of features.token_stats),
+# the WordFrequencyIndex of the clean articles and the NgramCounts of count_ngrams
+def report_figures(df, word_index, ngram_counts, stop_words = (), mask_path = None,
+                   wordcloud_cache = "../data/wordcloud_cache", max_words = 2000):
+    isfake = df['isfake'].to_numpy()
+    figures = {}
+
+    classes = df['isfake'].value_counts(sort = False).sort_index()
+    figures['class_counts.png'] = ('class_counts', {'isfake': classes.index.tolist(), 'count': classes.tolist()})
+
+    subjects = df.groupby(['subject', 'isfake'], sort = False).size()
+    figures['subject_counts.png'] = ('subject_counts', {
+        'subject': subjects.index.get_level_values(0).tolist(),
+        'isfake': subjects.index.get_level_values(1).tolist(),
+        'count': subjects.tolist(),
+    })
+
+    # Only the words that end up in the cloud are inputs of the figure
+    # (the map shaped clouds are only drawn when there is a mask image)
+    from wordclouds import normalize_frequencies
+    mask_digest = _file_digest(mask_path) if mask_path else None
+    clouds = [
+        ('wordcloud_real.png', 0, None, {'width': 1600, 'height': 800}),
+        ('wordcloud_fake.png', 1, None, {'width': 1600, 'height': 800}),
+    ]
+    if mask_path:
+        clouds += [
+            ('wordcloud_fake_map.png', 1, mask_path, {'background_color': "white", 'max_font_size': 256,
+                                                      'contour_width': 2, 'contour_color': 'lightgrey', 'random_state': 42}),
+            ('wordcloud_real_map.png', 0, mask_path, {'background_color': "white", 'max_font_size': 256,
+                                                      'contour_width': 3, 'contour_color': 'lightgrey', 'random_state': 42}),
+        ]
+    for name, label, mask, params in clouds:
+        words = sorted(normalize_frequencies(word_index.frequencies(isfake = label), stop_words).items(),
+                       key = lambda x: (-x[1], x[0]))[:max_words]
+        figures[name] = ('wordcloud', {'words': words, 'max_words': max_words, 'params': params, 'mask_path': mask,
+                                       'mask_digest': mask_digest if mask else None, 'cache_dir': wordcloud_cache})
+
+    counts, edges = np.histogram(df['n_tokens'], bins = 100)
+    figures['token_histogram.html'] = ('token_histogram', {'edges': edges.tolist(), 'counts': counts.tolist()})
+    figures['chars_per_article.png'] = ('class_histograms', {
+        'histograms': _histograms(df['n_chars'].to_numpy(), isfake),
+        'titles': ['Real Articles', 'Fake Articles'], 'suptitle': 'Number of characters in articles'})
+    figures['words_per_article.png'] = ('class_histograms', {
+        'histograms': _histograms(df['n_words'].to_numpy(), isfake),
+        'titles': ['Real Article', 'Fake Article'], 'suptitle': 'Number of words in articles'})
+
+    for label, kind in ((0, 'real'), (1, 'fake')):
+        figures['top_words_%s.html' % kind] = ('top_words', {
+            'words': word_index.top(30, isfake = label), 'title': 'Top 30 words from %s news' % kind})
+
+    for g, kind in ((1, 'Unigrams'), (2, 'Bigrams'), (3, 'Trigrams')):
+        figures['top_%s.png' % kind.lower()] = ('ngram_bars', {
+            'ngrams': ngram_counts.top(g, 10), 'title': "Top 10 %s in all news" % kind})
+    return figures
+
+
+# Hash of everything a figure is drawn from
+def figure_key(renderer, inputs):
+    return hashlib.sha1(json.dumps([REPORT_VERSION, renderer, inputs], sort_keys = True,
+                                   default = str).encode("utf-8")).hexdigest()
+
+
+def _render(renderer, inputs, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    tmp_path = path + ".tmp" + os.path.splitext(path)[1]
+    RENDERERS[renderer](inputs, tmp_path)
+    plt.close('all')
+    os.replace(tmp_path, path)
+    return path
+
+
+def _write_index(output_dir, names):
+    items = []
+    for name in sorted(names):
+        if name.endswith(".html"):
+            items.append('<h3>%s</h3><iframe src="%s" width="100%%" height="600" frameborder="0"></iframe>' % (name, name))
+        else:
+            items.append('<h3>%s</h3><img src="%s" style="max-width: 100%%">' % (name, name))
+    with open(os.path.join(output_dir, "index.html"), "w") as f:
+        f.write("<html><head><title>Fake news EDA report</title></head><body>\n%s\n</body></html>\n" % "\n".join(items))
+
+
+# Draws the figures of report_figures into output_dir with n_jobs worker processes (default: all cores)
+# Figures whose inputs did not change since the last run are kept as they are, force = True draws them all.
+# Returns the file names of the figures that were drawn.
+# The workers are started like the cleaning workers (preprocessing._mp_context, fork where available) because
+# the notebook calls render_report at the top level of the script, mp_context overrides it.
+def render_report(figures, output_dir, n_jobs = None, force = False, mp_context = None):
+    os.makedirs(output_dir, exist_ok = True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    keys = {name: figure_key(renderer, inputs) for name, (renderer, inputs) in figures.items()}
+    stale = [name for name in figures
+             if manifest.get(name) != keys[name] or not os.path.exists(os.path.join(output_dir, name))]
+
+    if stale:
+        from preprocessing import _mp_context
+        with ProcessPoolExecutor(max_workers = n_jobs, mp_context = mp_context or _mp_context()) as executor:
+            futures = {name: executor.submit(_render, figures[name][0], figures[name][1], os.path.join(output_dir, name))
+                       for name in stale}
+            for name, future in futures.items():
+                future.result()
+                manifest[name] = keys[name]
+
+    # Figures that are no longer part of the report are dropped from the manifest
+    manifest = {name: key for name, key in manifest.items() if name in figures}
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent = 2, sort_keys = True)
+    os.replace(tmp_path, manifest_path)
+    _write_index(output_dir, figures)
+    return stale
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Write the EDA figures of the fake news data to files")
+    parser.add_argument("--data-dir", default = "../data", help = "folder with True.csv and Fake.csv")
+    parser.add_argument("--output", default = "../reports/eda", help = "folder the figures are written to")
+    parser.add_argument("--mask", default = "../imgs/USACanada_BlankMap.png", help = "mask image of the map word clouds")
+    parser.add_argument("--jobs", type = int, default = None, help = "worker processes (default: all cores)")
+    parser.add_argument("--force", action = "store_true", help = "draw every figure again")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from preprocessing import stop_words, cached_clean_series
+    from features import token_stats
+    from wordindex import WordFrequencyIndex
+    from corpus import build_corpus
+
+    # Same steps as the notebook, the clean articles and the word counts are reused from its caches
+    df_real = pd.read_csv(os.path.join(args.data_dir, "True.csv"))
+    df_fake = pd.read_csv(os.path.join(args.data_dir, "Fake.csv"))
+    df_real['isfake'] = 0
+    df_fake['isfake'] = 1
+    df_allnews = pd.concat([df_real, df_fake]).reset_index(drop = True)
+    df_allnews['fullarticle'] = df_allnews['title'] + ' ' + df_allnews['text']
+    df_allnews['clean'] = cached_clean_series(df_allnews['fullarticle'], os.path.join(args.data_dir, "clean_cache.parquet"),
+                                              n_jobs = args.jobs)
+    corpus = build_corpus(df_allnews.clean, os.path.join(args.data_dir, "corpus"), labels = df_allnews.isfake)
+    df_allnews[['n_tokens', 'n_chars', 'n_words']] = token_stats(df_allnews, corpus = corpus)
+
+    word_index_path = os.path.join(args.data_dir, "word_index.json")
+    word_index = WordFrequencyIndex.load(word_index_path)
+    word_index.sync(df_allnews.clean, df_allnews.isfake)
+    word_index.save(word_index_path)
+    ngram_counts = corpus.ngram_counts(orders = (1, 2, 3))
+
+    figures = report_figures(df_allnews, word_index, ngram_counts, stop_words, mask_path = args.mask,
+                             wordcloud_cache = os.path.join(args.data_dir, "wordcloud_cache"))
+    drawn = render_report(figures, args.output, n_jobs = args.jobs, force = args.force)
+    print("Drew %d of %d figures into %s" % (len(drawn), len(figures), args.output))
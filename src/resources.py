@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# The NLTK data the pipeline needs (stopwords, wordnet, punkt) is only looked up in the local
+# nltk_data folders, it is never downloaded while the pipeline runs so it also works offline.
+# Install it once per machine (or docker image) with
+#
+#   python -m nltk.downloader stopwords wordnet omw-1.4 punkt punkt_tab
+#
+# or into a folder of your own with -d /path/to/nltk_data and NLTK_DATA=/path/to/nltk_data.
+# The folders are searched here without importing nltk (import nltk also imports scipy and sklearn and
+# takes more than a second), so processes that only clean or score articles start quickly.
+
+import os
+import sys
+import zipfile
+
+
+NLTK_RESOURCES = {
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet',
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',   # newer nltk versions tokenize with punkt_tab instead of punkt
+}
+
+
+# The folders nltk.data.path searches: NLTK_DATA, ~/nltk_data and the system wide nltk_data folders
+def nltk_data_path():
+    path = [p for p in os.environ.get('NLTK_DATA', '').split(os.pathsep) if p]
+    if os.path.expanduser("~/") != "~/":
+        path.append(os.path.expanduser("~/nltk_data"))
+    path += [os.path.join(sys.prefix, "nltk_data"), os.path.join(sys.prefix, "share", "nltk_data"),
+             os.path.join(sys.prefix, "lib", "nltk_data")]
+    if sys.platform.startswith("win"):
+        path += [os.path.join(os.environ.get('APPDATA', "C:\\"), "nltk_data"),
+                 r"C:\nltk_data", r"D:\nltk_data", r"E:\nltk_data"]
+    else:
+        path += ["/usr/share/nltk_data", "/usr/local/share/nltk_data", "/usr/lib/nltk_data", "/usr/local/lib/nltk_data"]
+    return path
+
+
+# Local path of the first of the given NLTK packages that is installed (its folder, or its zip file when
+# it was not unzipped), raises a LookupError with the command that installs them if none of them is
+def require_nltk(*packages):
+    path = nltk_data_path()
+    for package in packages:
+        for folder in path:
+            resource = os.path.join(folder, *NLTK_RESOURCES[package].split("/"))
+            if os.path.isdir(resource):
+                return resource
+            if os.path.isfile(resource + ".zip"):
+                return resource + ".zip"
+    raise LookupError("NLTK data %s not found in %s (the pipeline does not download it), install it with:\n"
+                      "    python -m nltk.downloader %s" % (" or ".join(packages), path, " ".join(packages)))
+
+
+# The words of a word list of an NLTK package, e.g. nltk_words("stopwords", "english") gives the same
+# list as nltk.corpus.stopwords.words("english") (one word per line, blank lines skipped)
+def nltk_words(package, fileid):
+    resource = require_nltk(package)
+    if resource.endswith(".zip"):
+        with zipfile.ZipFile(resource) as archive:
+            text = archive.read(os.path.basename(resource)[:-len(".zip")] + "/" + fileid).decode("utf-8")
+    else:
+        with open(os.path.join(resource, fileid), encoding = "utf-8") as f:
+            text = f.read()
+    return [line for line in text.splitlines() if line.rstrip()]
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Small local HTTP server scoring articles with the trained model (no web framework needed, only asyncio)
+#
+#   POST /predict   {"text": "..."} or {"texts": ["...", ...]}  ->  {"probabilities": [...], "isfake": [...]}
+#   GET  /metrics   latency percentiles (ms) and batch sizes of the model calls
+#   GET  /health
+#
+# Requests that arrive at about the same time are put together: the first waiting article starts a
+# batch, which is sent to the model once it has max_batch_size articles or max_wait_ms have passed.
+# Cleaning, encoding and padding are the same as for training (FakeNewsPredictor in predict.py).
+
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from predict import FakeNewsPredictor
+
+
+class MicroBatcher:
+
+    def __init__(self, predictor, max_batch_size = 64, max_wait_ms = 5, window = 10000):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        # The model runs in its own thread so the server keeps accepting requests meanwhile
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+        self.latencies = deque(maxlen = window)     # seconds from request to answer, per article
+        self.batch_sizes = deque(maxlen = window)   # articles per model call
+        self.articles = 0
+
+    # Probability of one article being fake, waits until the batch it ends up in has been scored
+    async def score(self, text):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _, _ in batch]
+            try:
+                probabilities = await loop.run_in_executor(self.executor, self.predictor.predict, texts)
+            except Exception as error:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            done = time.perf_counter()
+            self.batch_sizes.append(len(batch))
+            self.articles += len(batch)
+            for (_, future, start), probability in zip(batch, probabilities):
+                self.latencies.append(done - start)
+                if not future.done():
+                    future.set_result(float(probability))
+
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000
+        batch_sizes = np.array(self.batch_sizes)
+        return {
+            'articles': self.articles,
+            'batches': len(batch_sizes),
+            'latency_ms_p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'latency_ms_p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'batch_size_mean': float(batch_sizes.mean()) if len(batch_sizes) else None,
+            'batch_size_p50': float(np.percentile(batch_sizes, 50)) if len(batch_sizes) else None,
+            'batch_size_max': int(batch_sizes.max()) if len(batch_sizes) else None,
+        }
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+
+def _response(status, data, keep_alive):
+    body = json.dumps(data).encode("utf-8")
+    head = ("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n"
+            % (status, REASONS[status], len(body), "keep-alive" if keep_alive else "close"))
+    return head.encode("latin-1") + body
+
+
+async def _handle_request(batcher, method, path, body):
+    if method == "GET" and path == "/health":
+        return 200, {'status': 'ok'}
+    if method == "GET" and path == "/metrics":
+        return 200, batcher.metrics()
+    if method == "POST" and path == "/predict":
+        try:
+            data = json.loads(body or b"{}")
+            if not isinstance(data, dict):
+                raise TypeError("the body must be a JSON object")
+            texts = data['texts'] if 'texts' in data else [data['text']]
+            if not isinstance(texts, list):
+                raise TypeError("texts must be a list of articles")
+            if not all(isinstance(text, str) for text in texts):
+                raise ValueError("articles must be strings")
+        except (ValueError, KeyError, TypeError) as error:
+            return 400, {'error': "expected {\"text\": ...} or {\"texts\": [...]}: %s" % error}
+        probabilities = await asyncio.gather(*(batcher.score(text) for text in texts))
+        return 200, {'probabilities': probabilities, 'isfake': [int(p > 0.5) for p in probabilities]}
+    return 404, {'error': "unknown endpoint %s %s" % (method, path)}
+
+
+# One client connection, answers requests until the client closes it (or asks to)
+async def handle_connection(batcher, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, path, version = request_line.decode("latin-1").split()
+            except ValueError:
+                writer.write(_response(400, {'error': "bad request line"}, False))
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            try:
+                length = int(headers.get('content-length', 0))
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                writer.write(_response(400, {'error': "bad Content-Length"}, False))
+                break
+            body = await reader.readexactly(length)
+            keep_alive = headers.get('connection', '').lower() != 'close' and version == "HTTP/1.1"
+            try:
+                status, data = await _handle_request(batcher, method, path, body)
+            except Exception as error:
+                status, data = 500, {'error': str(error)}
+            writer.write(_response(status, data, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(predictor, host = "127.0.0.1", port = 8080, max_batch_size = 64, max_wait_ms = 5):
+    batcher = MicroBatcher(predictor, max_batch_size = max_batch_size, max_wait_ms = max_wait_ms)
+    batch_task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(lambda r, w: handle_connection(batcher, r, w), host, port)
+    print("Scoring articles on http://%s:%d/predict" % (host, port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Serve the fake news model over HTTP")
+    parser.add_argument("--model-dir", default = "../models", help = "folder written by save_model_artifacts")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8080)
+    parser.add_argument("--max-batch-size", type = int, default = 64, help = "most articles per model call")
+    parser.add_argument("--max-wait-ms", type = float, default = 5, help = "longest wait for more articles before a model call")
+    parser.add_argument("--tflite", action = "store_true", help = "score with the quantized TensorFlow Lite model")
+    args = parser.parse_args()
+
+    predictor = FakeNewsPredictor.load(args.model_dir, batch_size = args.max_batch_size, tflite = args.tflite)
+    asyncio.run(serve(predictor, args.host, args.port, args.max_batch_size, args.max_wait_ms))
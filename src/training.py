@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Data parallel training of fakenews_model on CPU machines with tf.distribute
+# - In one process, make_strategy(replicas) splits the CPU into replicas logical devices and trains a
+#   copy of the model on each of them (MirroredStrategy), every replica gets a part of every batch.
+# - With several processes (e.g. one per socket), every process is a worker of a
+#   MultiWorkerMirroredStrategy. They can all be started on the local machine with
+#
+#     python training.py --data ../data/train_arrays.npz --workers 2 --epochs 10
+#
+#   which pins every worker to its own share of the cores and writes the throughput of the run
+#   to ../reports/training_throughput.json
+# batch_size is per replica, so the global batch grows with the number of replicas and the learning
+# rate is scaled with it (scaled_hyperparameters). ReduceLROnPlateau behaves as in the notebook, with
+# min_lr scaled by the same factor. throughput_callback reports the training samples per second of every epoch.
+# The replicas of one process share its intra-op thread pool, so they do not add any cores: whether more
+# replicas (or workers) train faster depends on the machine, compare the samples per second that
+# ../reports/training_throughput.json records for every run before changing the defaults.
+
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import argparse
+import subprocess
+
+import numpy as np
+
+
+# Batch size and Adam learning rate the notebook was tuned with (one replica)
+BASE_BATCH_SIZE = 64
+BASE_LEARNING_RATE = 0.001
+MIN_LEARNING_RATE = 0.00001
+
+
+# Sets the TensorFlow thread pools, has to be called before TensorFlow runs anything
+# intra_op: threads used inside one op (matrix multiplications), inter_op: ops run at the same time
+def configure_threads(intra_op = None, inter_op = None):
+    import tensorflow as tf
+    threading = tf.config.threading
+    if intra_op and threading.get_intra_op_parallelism_threads() != intra_op:
+        threading.set_intra_op_parallelism_threads(intra_op)
+    if inter_op and threading.get_inter_op_parallelism_threads() != inter_op:
+        threading.set_inter_op_parallelism_threads(inter_op)
+
+
+# MultiWorkerMirroredStrategy when this process is one of several workers (TF_CONFIG is set),
+# otherwise a MirroredStrategy over replicas logical CPU devices, or the default strategy for 1 replica
+# The logical devices can only be set before TensorFlow initializes its runtime, so they are checked with
+# get_logical_device_configuration (list_logical_devices would initialize it)
+def make_strategy(replicas = 1):
+    import tensorflow as tf
+    if 'TF_CONFIG' in os.environ:
+        return tf.distribute.MultiWorkerMirroredStrategy()
+    if replicas <= 1:
+        return tf.distribute.get_strategy()
+    cpu = tf.config.list_physical_devices('CPU')[0]
+    if len(tf.config.get_logical_device_configuration(cpu) or []) != replicas:
+        try:
+            tf.config.set_logical_device_configuration(cpu, [tf.config.LogicalDeviceConfiguration()] * replicas)
+        except RuntimeError as error:
+            raise RuntimeError("make_strategy(%d) has to be called before TensorFlow runs anything "
+                               "(restart the kernel): %s" % (replicas, error))
+    devices = ['/cpu:%d' % i for i in range(replicas)]
+    return tf.distribute.MirroredStrategy(devices, cross_device_ops = tf.distribute.ReductionToOneDevice())
+
+
+# Global batch size and learning rate for replicas copies of the model, each with batch_size articles per step
+# rule = 'linear' scales the learning rate with the global batch, 'sqrt' with its square root
+# (gentler, usually better for Adam) and None keeps it as it is
+def scaled_hyperparameters(replicas, batch_size = BASE_BATCH_SIZE, learning_rate = BASE_LEARNING_RATE, rule = 'sqrt'):
+    global_batch_size = batch_size * replicas
+    factor = global_batch_size / BASE_BATCH_SIZE
+    if rule == 'linear':
+        learning_rate *= factor
+    elif rule == 'sqrt':
+        learning_rate *= factor ** 0.5
+    return global_batch_size, learning_rate
+
+
+# Keras callback keeping the training samples per second of every epoch in samples_per_second
+# (the validation at the end of the epoch is not counted), n_samples is the number of training
+# samples of one epoch over all the replicas
+def throughput_callback(n_samples, verbose = 1):
+    import tensorflow as tf
+
+    class ThroughputCallback(tf.keras.callbacks.Callback):
+
+        def __init__(self):
+            super().__init__()
+            self.samples_per_second = []
+            self.start = None
+
+        def on_epoch_begin(self, epoch, logs = None):
+            self.start = time.perf_counter()
+
+        def _done(self):
+            if self.start is None:
+                return
+            self.samples_per_second.append(n_samples / (time.perf_counter() - self.start))
+            self.start = None
+            if verbose:
+                print("\nTraining samples per second: %.1f" % self.samples_per_second[-1])
+
+        # called when the validation of the epoch starts
+        def on_test_begin(self, logs = None):
+            self._done()
+
+        def on_epoch_end(self, epoch, logs = None):
+            self._done()
+
+    return ThroughputCallback()
+
+
+# Builds fakenews_model in the strategy's scope and trains it on the padded sequences x and labels y
+# Like fit(..., validation_split = validation_split) the last rows are used for validation.
+# Every worker has to shuffle with the same seed: with DATA sharding each worker reads the whole dataset and
+# keeps only its own share of it, so the epoch is only split between the workers when they all see the same order.
+# Returns the model, the Keras history and the samples per second of every epoch.
+def fit_distributed(x, y, max_features, maxlength, strategy, epochs = 10, batch_size = BASE_BATCH_SIZE,
+                    validation_split = 0.1, lr_rule = 'sqrt', embedding_size = 128, seed = 42, verbose = 1):
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import ReduceLROnPlateau
+    from model import build_fakenews_model
+
+    global_batch_size, learning_rate = scaled_hyperparameters(strategy.num_replicas_in_sync, batch_size,
+                                                              rule = lr_rule)
+    split_at = int(len(x) * (1 - validation_split))
+
+    # every worker reads the same arrays and keeps its own share of the batches
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+    train_ds = (tf.data.Dataset.from_tensor_slices((x[:split_at], y[:split_at]))
+                .shuffle(split_at, seed = seed, reshuffle_each_iteration = True)
+                .batch(global_batch_size).with_options(options).prefetch(tf.data.AUTOTUNE))
+    val_ds = (tf.data.Dataset.from_tensor_slices((x[split_at:], y[split_at:]))
+              .batch(global_batch_size).with_options(options).prefetch(tf.data.AUTOTUNE))
+
+    with strategy.scope():
+        model = build_fakenews_model(max_features, embedding_size, maxlength,
+                                     optimizer = tf.keras.optimizers.Adam(learning_rate))
+
+    learning_rate_reduction = ReduceLROnPlateau(monitor = 'val_accuracy', patience = 2, verbose = verbose, factor = 0.5,
+                                                min_lr = MIN_LEARNING_RATE * learning_rate / BASE_LEARNING_RATE)
+    throughput = throughput_callback(split_at, verbose = verbose)
+    history = model.fit(train_ds, validation_data = val_ds, epochs = epochs,
+                        callbacks = [learning_rate_reduction, throughput], verbose = verbose)
+    return model, history, throughput.samples_per_second
+
+
+# Padded training sequences and labels for the workers (x_train and y_train of the notebook)
+def save_training_arrays(path, x, y):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+    np.savez(path, x = np.asarray(x, dtype = np.int32), y = np.asarray(y, dtype = np.int32))
+
+
+def _free_ports(n):
+    sockets = [socket.socket() for _ in range(n)]
+    for s in sockets:
+        s.bind(("localhost", 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+# The cores of this machine split into n contiguous groups, one per worker
+# (with more workers than cores, workers share the groups)
+def _cpu_groups(n):
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    groups = [group.tolist() for group in np.array_split(cpus, min(n, len(cpus)))]
+    return [groups[i % len(groups)] for i in range(n)]
+
+
+# Starts n local worker processes of a MultiWorkerMirroredStrategy, each running this script with args
+# and pinned to its own group of cores. Returns the exit codes of the workers.
+def launch_local_workers(n, args):
+    ports = _free_ports(n)
+    cluster = {'worker': ["localhost:%d" % port for port in ports]}
+    processes = []
+    for index, cpus in enumerate(_cpu_groups(n)):
+        env = dict(os.environ, TF_CONFIG = json.dumps({'cluster': cluster, 'task': {'type': 'worker', 'index': index}}))
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)] + args +
+                                          ["--cpus", ",".join(map(str, cpus))], env = env))
+    return [process.wait() for process in processes]
+
+
+def _append_report(path, entry):
+    runs = []
+    if os.path.exists(path):
+        with open(path) as f:
+            runs = json.load(f)
+    runs.append(entry)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+    with open(path, "w") as f:
+        json.dump(runs, f, indent = 2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Data parallel training of the fake news model on CPU")
+    parser.add_argument("--data", default = "../data/train_arrays.npz", help = "file written by save_training_arrays")
+    parser.add_argument("--output", default = "../models/distributed", help = "folder the trained model is saved to")
+    parser.add_argument("--report", default = "../reports/training_throughput.json", help = "throughput of every run")
+    parser.add_argument("--workers", type = int, default = 1, help = "local worker processes (MultiWorkerMirroredStrategy)")
+    parser.add_argument("--replicas", type = int, default = 1, help = "logical CPU devices in one process (MirroredStrategy)")
+    parser.add_argument("--intra-op", type = int, default = None, help = "threads inside one op (default: cores of the worker)")
+    parser.add_argument("--inter-op", type = int, default = None, help = "ops run at the same time")
+    parser.add_argument("--batch-size", type = int, default = BASE_BATCH_SIZE, help = "articles per step of every replica")
+    parser.add_argument("--lr-rule", choices = ['linear', 'sqrt', 'none'], default = 'sqrt')
+    parser.add_argument("--epochs", type = int, default = 10)
+    parser.add_argument("--max-features", type = int, default = 100000)
+    parser.add_argument("--validation-split", type = float, default = 0.1)
+    parser.add_argument("--seed", type = int, default = 42, help = "shuffle seed, the same for every worker")
+    parser.add_argument("--cpus", default = None, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.workers > 1 and 'TF_CONFIG' not in os.environ:
+        sys.exit(max(launch_local_workers(args.workers, sys.argv[1:])))
+
+    if args.cpus and hasattr(os, 'sched_setaffinity'):
+        cpus = [int(c) for c in args.cpus.split(",")]
+        os.sched_setaffinity(0, cpus)
+        args.intra_op = args.intra_op or len(cpus)
+    configure_threads(args.intra_op, args.inter_op)
+    strategy = make_strategy(args.replicas)
+
+    data = np.load(args.data)
+    x, y = data['x'], data['y']
+    lr_rule = None if args.lr_rule == 'none' else args.lr_rule
+    model, history, samples_per_second = fit_distributed(x, y, args.max_features, x.shape[1], strategy,
+                                                         epochs = args.epochs, batch_size = args.batch_size,
+                                                         validation_split = args.validation_split, lr_rule = lr_rule,
+                                                         seed = args.seed)
+
+    # every worker has to save, only the first one (the chief) keeps its copy
+    task = json.loads(os.environ.get('TF_CONFIG', '{}')).get('task', {})
+    if task.get('index', 0) == 0:
+        os.makedirs(args.output, exist_ok = True)
+        model.save(os.path.join(args.output, "fakenews_model.keras"))
+        global_batch_size, learning_rate = scaled_hyperparameters(strategy.num_replicas_in_sync, args.batch_size,
+                                                                  rule = lr_rule)
+        _append_report(args.report, {
+            'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'workers': args.workers,
+            'replicas': strategy.num_replicas_in_sync,
+            'intra_op_threads': args.intra_op,
+            'inter_op_threads': args.inter_op,
+            'global_batch_size': global_batch_size,
+            'learning_rate': learning_rate,
+            'samples_per_second': samples_per_second,
+            'mean_samples_per_second': float(np.mean(samples_per_second)) if samples_per_second else None,
+            'val_accuracy': history.history.get('val_accuracy'),
+        })
+        print("Mean training samples per second: %.1f" % np.mean(samples_per_second))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            model.save(os.path.join(tmp, "fakenews_model.keras"))
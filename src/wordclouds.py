@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Word clouds made from precomputed word counts (e.g. the WordFrequencyIndex of wordindex.py)
+# Rendered word clouds are kept as PNG files in a cache folder, named after a hash of the words
+# and counts that end up in the cloud and of all the WordCloud settings. Rendering the same
+# cloud again just reads the PNG back.
+
+import os
+import re
+import json
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+
+# Reading the mask image once per process (and hashing it for the cache key)
+@lru_cache(maxsize = None)
+def _load_mask(mask_path):
+    with open(mask_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return np.array(Image.open(mask_path)), digest
+
+
+# The index splits the articles on whitespace, so "said," and "said" are counted as two words.
+# WordCloud(...).generate(text) used to split the text itself, this redoes that on the counts:
+# every whitespace word is split into WordCloud's words (which drops the punctuation), a trailing 's is
+# removed, numbers and stopwords are left out, the counts of the words that end up the same are added
+# together and plurals are merged into their singular ("cats" -> "cat") when both are there.
+# The only difference left with generate is that no two word phrases (collocations) are shown.
+def normalize_frequencies(frequencies, stopwords = (), regexp = r"\w[\w']*"):
+    stopwords = set(word.lower() for word in stopwords)
+    counts = {}
+    for token, count in frequencies.items():
+        for word in re.findall(regexp, token):
+            if word.lower().endswith("'s"):
+                word = word[:-2]
+            if not word or word.isdigit() or word.lower() in stopwords:
+                continue
+            counts[word] = counts.get(word, 0) + count
+    for word in list(counts):
+        if word.endswith('s') and not word.endswith('ss') and word[:-1] in counts:
+            counts[word[:-1]] += counts.pop(word)
+    return counts
+
+
+# Returns the word cloud of the given {word: count} frequencies as an image array (for plt.imshow)
+# The counts are first normalized like WordCloud.generate would (normalize_frequencies), words in stopwords
+# are left out and only the max_words most common words are used.
+# mask_path is an optional image the words are drawn into, any other keyword arguments are passed on to WordCloud.
+def wordcloud_image(frequencies, cache_dir, stopwords = (), max_words = 2000, mask_path = None, **params):
+    words = sorted(normalize_frequencies(frequencies, stopwords).items(), key = lambda x: (-x[1], x[0]))[:max_words]
+
+    mask, mask_digest = _load_mask(mask_path) if mask_path else (None, None)
+
+    key = hashlib.sha1(json.dumps([words, max_words, mask_digest, sorted(params.items())],
+                                  default = str).encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, key + ".png")
+    if os.path.exists(path):
+        return np.array(Image.open(path))
+
+    from wordcloud import WordCloud
+    wc = WordCloud(max_words = max_words, mask = mask, **params).generate_from_frequencies(dict(words))
+    os.makedirs(cache_dir, exist_ok = True)
+    wc.to_file(path)
+    return wc.to_array()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Word frequency index for the clean articles, one word -> count table per class (isfake = 0/1)
+# The index is saved to disk, and syncing it with the corpus later only has to count the words of the
+# articles that are not in the index yet. The top 30 word plots and the word clouds are
+# then made from the index instead of joining the whole corpus into one giant string.
+
+import os
+import json
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import CLEAN_VERSION
+
+
+# Layout of the saved index, an index saved with another layout is built again
+INDEX_FORMAT = 3
+
+
+class WordFrequencyIndex:
+
+    def __init__(self, version = CLEAN_VERSION):
+        self.version = version
+        self.counts = {}        # isfake -> Counter of word counts
+        self.seen = Counter()   # hash of an article and its label -> number of copies of it already counted
+
+    # 64 bit hashes of the (clean article, label) pairs, used to recognize the articles that were already
+    # counted, a relabeled article gets another hash (hashed by pandas in one vectorized pass instead of
+    # one Python hash call per article)
+    @staticmethod
+    def keys(texts, labels):
+        pairs = pd.DataFrame({'text': pd.Series(texts, dtype = object), 'label': np.asarray(labels, dtype = np.int64)})
+        return pd.util.hash_pandas_object(pairs, index = False).to_numpy()
+
+    # Copy number of every article: 1 for the first time a text appears in texts, 2 for the second...
+    @staticmethod
+    def _copies(keys):
+        return pd.Series(keys).groupby(keys).cumcount().to_numpy() + 1
+
+    # Counts the words (split on whitespace) of the articles that are not in the index yet.
+    # Passing the whole corpus again only adds the new articles: the k-th copy of an article is
+    # only counted if the index has seen fewer than k copies of it.
+    # keys are the hashes of texts and labels (WordFrequencyIndex.keys), when the caller already has them.
+    # Returns the number of articles that were added.
+    def add(self, texts, labels, keys = None):
+        texts, labels = list(texts), np.asarray(labels)
+        keys = self.keys(texts, labels) if keys is None else np.asarray(keys)
+        seen = np.array([self.seen.get(k, 0) for k in keys.tolist()], dtype = np.int64)
+        new = np.flatnonzero(self._copies(keys) > seen)
+        for i in new:
+            self.seen[int(keys[i])] += 1
+            self.counts.setdefault(int(labels[i]), Counter()).update(texts[i].split())
+        return len(new)
+
+    # Makes the index count exactly the articles of texts: new articles are added, and when articles
+    # the index has counted are not in texts anymore (removed, changed or relabeled), their words can not be
+    # subtracted without their text, so the index is counted again from texts.
+    # Returns the number of articles that were counted.
+    def sync(self, texts, labels):
+        texts, labels = list(texts), np.asarray(labels)
+        keys = self.keys(texts, labels)
+        current = Counter(keys.tolist())
+        if any(current[k] < copies for k, copies in self.seen.items()):
+            self.counts, self.seen = {}, Counter()
+        return self.add(texts, labels, keys)
+
+    # Adds the counts of another index (e.g. built from a different batch of articles) to this one
+    def merge(self, other):
+        for label, counter in other.counts.items():
+            self.counts.setdefault(label, Counter()).update(counter)
+        self.seen.update(other.seen)
+        return self
+
+    # Word counts of one class, or of all articles when isfake is None
+    def frequencies(self, isfake = None):
+        if isfake is not None:
+            return self.counts.get(isfake, Counter())
+        total = Counter()
+        for counter in self.counts.values():
+            total.update(counter)
+        return total
+
+    # The n most common words as (word, count) pairs
+    def top(self, n = 30, isfake = None):
+        return self.frequencies(isfake).most_common(n)
+
+    # Number of times a word appears (in one class, or in all articles)
+    def count(self, word, isfake = None):
+        if isfake is not None:
+            return self.counts.get(isfake, Counter())[word]
+        return sum(counter[word] for counter in self.counts.values())
+
+    def save(self, path):
+        data = {
+            'version': self.version,
+            'format': INDEX_FORMAT,
+            'counts': {str(label): dict(counter) for label, counter in self.counts.items()},
+            'seen': dict(self.seen),
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    # Loads the index saved at path. A missing file, an index saved in another layout, or an index built
+    # by another version of the cleaning (whose clean articles would not match anymore), gives an empty index.
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != index.version or data.get('format') != INDEX_FORMAT:
+            return index
+        index.counts = {int(label): Counter(counter) for label, counter in data['counts'].items()}
+        index.seen = Counter({int(k): copies for k, copies in data['seen'].items()})
+        return index